@@ -1,13 +1,40 @@
 
 import os
+from sqlalchemy.pool import NullPool
+
+def engine_options(database_uri):
+    """Connection pool settings for the SQLAlchemy engine"""
+    if database_uri.startswith("sqlite"):
+        # SQLite connections are local files; just allow them to be shared with the pool's threads
+        return {"connect_args": {"check_same_thread": False}}
+    if os.environ.get("DB_EXTERNAL_POOLER", "").lower() in ("1", "true", "yes"):
+        # DATABASE_URL points at PgBouncer (transaction mode), which owns pooling;
+        # holding our own idle connections on top would only pin pooler slots
+        return {"poolclass": NullPool}
+    # Keep warm connections sized to worker concurrency instead of reconnecting per request
+    return {
+        "pool_size": int(os.environ.get("DB_POOL_SIZE", 10)),
+        "max_overflow": int(os.environ.get("DB_MAX_OVERFLOW", 20)),
+        "pool_recycle": int(os.environ.get("DB_POOL_RECYCLE", 1800)),
+        "pool_pre_ping": True,
+    }
 
 class Config:
     SECRET_KEY = os.environ.get("SECRET_KEY") or "a-very-secret-key"
     SQLALCHEMY_DATABASE_URI = os.environ.get("DATABASE_URL") or \
         "sqlite:///" + os.path.join(os.path.abspath(os.path.dirname(__file__)), "src", "database", "app.db")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
     JWT_SECRET_KEY = os.environ.get("JWT_SECRET_KEY") or "super-secret-jwt-key"
     JWT_ACCESS_TOKEN_EXPIRES = int(os.environ.get("JWT_ACCESS_TOKEN_EXPIRES", 24 * 60 * 60)) # 24 hours
+    JWT_TOKEN_LOCATION = ["headers"]
+    JWT_HEADER_NAME = "Authorization" # Default, but good to be explicit
+    JWT_HEADER_TYPE = "Bearer" # Default, but good to be explicit
+
+    # Cache Configuration (set CACHE_TYPE=RedisCache and CACHE_REDIS_URL for multi-worker deployments)
+    CACHE_TYPE = os.environ.get("CACHE_TYPE", "SimpleCache")
+    CACHE_DEFAULT_TIMEOUT = int(os.environ.get("CACHE_DEFAULT_TIMEOUT", 60))
+    CACHE_REDIS_URL = os.environ.get("CACHE_REDIS_URL")
 
     # Logging Configuration
     LOG_FILE = os.path.join(os.path.abspath(os.path.dirname(__file__)), "agrisense.log")
@@ -0,0 +1,16 @@
+from flask_caching import Cache
+
+# Shared cache instance, bound to the app in create_app()
+cache = Cache()
+
+DASHBOARD_CACHE_TIMEOUT = 60
+
+
+def dashboard_cache_key(user_id):
+    """Key for a user's cached dashboard payload"""
+    return f'dashboard:{user_id}'
+
+
+def invalidate_dashboard(user_id):
+    """Drop a user's cached dashboard after their farms, analyses or profile change"""
+    cache.delete(dashboard_cache_key(user_id))
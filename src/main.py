@@ -1,7 +1,8 @@
 import os
 import sys
 import logging
-from logging.handlers import RotatingFileHandler
+import importlib
+import click
 
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
@@ -10,123 +11,176 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 from flask import Flask, send_from_directory, request, jsonify
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
+from sqlalchemy import event, inspect, text, select, or_
 from src.models.user import db
-from src.routes.user import user_bp
-from src.routes.auth import auth_bp
-from src.routes.farm import farm_bp
-from src.routes.soil_analysis import soil_bp
-from src.routes.utils import utils_bp
+from src.extensions import cache
+from src.json_provider import ORJSONProvider
 from src.middleware.error_handlers import register_error_handlers
 from src.middleware.request_logging import setup_request_logging
+from src.middleware.log_handlers import setup_file_logging
 
 # Import the new Config class
 from config import config_by_name
 
-app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
+# (module path, blueprint attribute, url prefix); route modules are only imported when registered
+BLUEPRINTS = (
+    ("src.routes.auth", "auth_bp", "/api/auth"),
+    ("src.routes.farm", "farm_bp", "/api"),
+    ("src.routes.soil_analysis", "soil_bp", "/api"),
+    ("src.routes.utils", "utils_bp", "/api"),
+    ("src.routes.user", "user_bp", "/api"),
+)
 
-# Load configuration from config.py
-config_name = os.environ.get("FLASK_CONFIG", "development")
-app.config.from_object(config_by_name[config_name])
 
+def _register(app, modpath, attr, prefix):
+    """Import a blueprint module on demand and register its blueprint"""
+    blueprint = getattr(importlib.import_module(modpath), attr)
+    app.register_blueprint(blueprint, url_prefix=prefix)
 
 
-# Configuration from app.config (These lines are redundant if loaded from config.py, but harmless)
-app.config["SECRET_KEY"] = app.config.get("SECRET_KEY")
-app.config["JWT_SECRET_KEY"] = app.config.get("JWT_SECRET_KEY")
-app.config["JWT_ACCESS_TOKEN_EXPIRES"] = app.config.get("JWT_ACCESS_TOKEN_EXPIRES")
-app.config["SQLALCHEMY_DATABASE_URI"] = app.config.get("SQLALCHEMY_DATABASE_URI")
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = app.config.get("SQLALCHEMY_TRACK_MODIFICATIONS")
+def _create_tables():
+    """Create all tables, plus any nullable columns and indexes missing from tables that already exist, and backfill health scores"""
+    # Import all models to ensure they are registered
+    from src.models.farm import Farm
+    from src.models.soil_analysis import SoilAnalysis, Recommendation
 
-log_dir = os.path.join(os.path.dirname(__file__), '..', 'logs') # Point to agrisense-backend/logs
-if not os.path.exists(log_dir):
-    os.makedirs(log_dir)
+    db.create_all()
+    # create_all() skips tables that already exist, so add any nullable columns and indexes they are missing
+    inspector = inspect(db.engine)
+    preparer = db.engine.dialect.identifier_preparer
+    for table in db.metadata.sorted_tables:
+        existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing_columns and column.nullable and column.server_default is None:
+                with db.engine.begin() as connection:
+                    connection.execute(text(
+                        f"ALTER TABLE {preparer.format_table(table)} "
+                        f"ADD COLUMN {preparer.format_column(column)} {column.type.compile(db.engine.dialect)}"
+                    ))
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+    _backfill_health_scores()
 
-# Define the log file path directly
-LOG_FILE_PATH = os.path.join(log_dir, 'agrisense.log')
 
-# Set up file handler for logging
-file_handler = RotatingFileHandler(LOG_FILE_PATH, maxBytes=10240, backupCount=10)
-file_handler.setFormatter(logging.Formatter(
-    '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
-))
-# Set level to DEBUG to capture all messages
-file_handler.setLevel(logging.DEBUG)
+def _backfill_health_scores():
+    """Store health scores for analyses saved before scores were persisted, so reads never have to"""
+    from src.models.soil_analysis import SoilAnalysis
+    from src.utils.scores import ensure_health_score
 
-# Add the file handler to the Flask app's logger
-app.logger.addHandler(file_handler)
-# Set the app's logger level to DEBUG as well
-app.logger.setLevel(logging.DEBUG)
+    unscored = db.session.scalars(
+        select(SoilAnalysis).where(or_(SoilAnalysis.health_score.is_(None), SoilAnalysis.overall_score.is_(None)))
+    ).all()
+    for analysis in unscored:
+        ensure_health_score(analysis)
+    db.session.commit()
 
 
-# Enable CORS for all routes
-CORS(app, origins="*")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Use WAL journaling so commits don't each pay a full fsync and readers don't block on writers"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA mmap_size=268435456")
+    cursor.close()
 
-# Initialize JWT
-jwt = JWTManager(app)
 
-# Add JWT configuration
-app.config["JWT_TOKEN_LOCATION"] = ["headers"] # <-- ADD THIS LINE
-app.config["JWT_HEADER_NAME"] = "Authorization" # Default, but good to be explicit
-app.config["JWT_HEADER_TYPE"] = "Bearer" # Default, but good to be explicit
+def create_app(config_name):
+    """Create and configure the Flask application"""
+    app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
+    app.json = ORJSONProvider(app)
 
+    # Load configuration from config.py
+    app.config.from_object(config_by_name[config_name])
 
-# Register blueprints
-app.register_blueprint(auth_bp, url_prefix="/api/auth")
-app.register_blueprint(farm_bp, url_prefix="/api")
-app.register_blueprint(soil_bp, url_prefix="/api")
-app.register_blueprint(utils_bp, url_prefix="/api")
-app.register_blueprint(user_bp, url_prefix="/api")
+    log_dir = os.path.join(os.path.dirname(__file__), '..', 'logs') # Point to agrisense-backend/logs
+    if not os.path.exists(log_dir):
+        os.makedirs(log_dir)
 
+    # Define the log file path directly
+    LOG_FILE_PATH = os.path.join(log_dir, 'agrisense.log')
 
-# Setup middleware
-register_error_handlers(app)
-setup_request_logging(app)
+    # Set up buffered, queue-backed file logging (DEBUG captures all messages)
+    setup_file_logging(app, LOG_FILE_PATH, logging.DEBUG)
+    # Set the app's logger level to DEBUG as well
+    app.logger.setLevel(logging.DEBUG)
 
 
-# Database configuration
-db.init_app(app)
+    # Enable CORS for all routes
+    CORS(app, origins="*")
 
+    # Initialize JWT
+    jwt = JWTManager(app)
 
-# Import all models to ensure they are registered
-from src.models.farm import Farm
-from src.models.soil_analysis import SoilAnalysis, Recommendation
 
-with app.app_context():
-    db.create_all()
+    # Register blueprints
+    for modpath, attr, prefix in BLUEPRINTS:
+        _register(app, modpath, attr, prefix)
+
+
+    # Setup middleware
+    register_error_handlers(app)
+    setup_request_logging(app)
+
+
+    # Database configuration
+    db.init_app(app)
+    cache.init_app(app)
 
+    if app.config["SQLALCHEMY_DATABASE_URI"].startswith("sqlite"):
+        with app.app_context():
+            event.listen(db.engine, "connect", _set_sqlite_pragmas)
 
-@app.route("/", defaults={"path": ""})
-@app.route("/<path:path>")
-def serve(path):
-    static_folder_path = app.static_folder
-    if static_folder_path is None:
-            return "Static folder not configured", 404
 
-    if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
-        return send_from_directory(static_folder_path, path)
-    else:
-        index_path = os.path.join(static_folder_path, "index.html")
-        if os.path.exists(index_path):
-            return send_from_directory(static_folder_path, "index.html")
+    @app.cli.command("init-db")
+    def init_db():
+        """Create database tables and any missing indexes"""
+        _create_tables()
+        click.echo("Database initialized.")
+
+    # Auto-create tables once per process tree in development; production uses `flask init-db`
+    if app.config.get("DEBUG") and not os.environ.get("DB_INITIALIZED"):
+        with app.app_context():
+            _create_tables()
+        os.environ["DB_INITIALIZED"] = "1"
+
+
+    @app.route("/", defaults={"path": ""})
+    @app.route("/<path:path>")
+    def serve(path):
+        static_folder_path = app.static_folder
+        if static_folder_path is None:
+                return "Static folder not configured", 404
+
+        if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
+            return send_from_directory(static_folder_path, path)
         else:
-            return "AgriSense API is running", 200
+            index_path = os.path.join(static_folder_path, "index.html")
+            if os.path.exists(index_path):
+                return send_from_directory(static_folder_path, "index.html")
+            else:
+                return "AgriSense API is running", 200
+
+    def health_check():
+        """Health check endpoint"""
+        app.logger.info("Health check endpoint accessed")
+        return {"status": "healthy", "service": "AgriSense API"}, 200
+
+    @app.errorhandler(404)
+    def not_found_error(error):
+        app.logger.warning(f"404 Not Found: {request.url}")
+        return jsonify({"error": "Not Found", "message": "The requested URL was not found on the server."}), 404
 
-def health_check():
-    """Health check endpoint"""
-    app.logger.info("Health check endpoint accessed")
-    return {"status": "healthy", "service": "AgriSense API"}, 200
+    @app.errorhandler(500)
+    def internal_error(error):
+        db.session.rollback()
+        app.logger.exception(f"500 Internal Server Error: {request.url}")
+        return jsonify({"error": "Internal Server Error", "message": "An unexpected error occurred on the server."}), 500
 
-@app.errorhandler(404)
-def not_found_error(error):
-    app.logger.warning(f"404 Not Found: {request.url}")
-    return jsonify({"error": "Not Found", "message": "The requested URL was not found on the server."}), 404
+    return app
 
-@app.errorhandler(500)
-def internal_error(error):
-    db.session.rollback()
-    app.logger.exception(f"500 Internal Server Error: {request.url}")
-    return jsonify({"error": "Internal Server Error", "message": "An unexpected error occurred on the server."}), 500
 
+app = create_app(os.environ.get("FLASK_CONFIG", "development"))
 
 
 if __name__ == "__main__":
@@ -1,112 +1,92 @@
-from flask import jsonify
+from flask import jsonify, Response
+import orjson
 from werkzeug.exceptions import HTTPException
 from flask_jwt_extended.exceptions import JWTExtendedException
 import logging
 
 logger = logging.getLogger(__name__)
 
+def _error_body(error, message, status_code):
+    """Serialize a fixed error payload once at import time"""
+    return orjson.dumps({'error': error, 'message': message, 'status_code': status_code})
+
+def _json_response(body, status_code):
+    """Wrap a pre-serialized body; a fresh Response is needed since after_request hooks mutate headers"""
+    return Response(body, status=status_code, mimetype='application/json')
+
+_BAD_REQUEST_BODY = _error_body('Bad Request', 'The request could not be understood by the server', 400)
+_UNAUTHORIZED_BODY = _error_body('Unauthorized', 'Authentication is required to access this resource', 401)
+_FORBIDDEN_BODY = _error_body('Forbidden', 'You do not have permission to access this resource', 403)
+_NOT_FOUND_BODY = _error_body('Not Found', 'The requested resource was not found', 404)
+_METHOD_NOT_ALLOWED_BODY = _error_body('Method Not Allowed', 'The method is not allowed for the requested URL', 405)
+_CONFLICT_BODY = _error_body('Conflict', 'The request could not be completed due to a conflict', 409)
+_UNPROCESSABLE_ENTITY_BODY = _error_body('Unprocessable Entity', 'The request was well-formed but contains semantic errors', 422)
+_RATE_LIMIT_EXCEEDED_BODY = _error_body('Rate Limit Exceeded', 'Too many requests. Please try again later', 429)
+_INTERNAL_SERVER_ERROR_BODY = _error_body('Internal Server Error', 'An unexpected error occurred on the server', 500)
+_BAD_GATEWAY_BODY = _error_body('Bad Gateway', 'The server received an invalid response from an upstream server', 502)
+_SERVICE_UNAVAILABLE_BODY = _error_body('Service Unavailable', 'The service is temporarily unavailable. Please try again later', 503)
+_AUTHENTICATION_ERROR_BODY = _error_body('Authentication Error', 'Invalid or expired authentication token', 401)
+_INVALID_VALUE_BODY = _error_body('Invalid Value', 'Invalid input value provided', 400)
+_UNHANDLED_EXCEPTION_BODY = _error_body('Internal Server Error', 'An unexpected error occurred', 500)
+
 def register_error_handlers(app):
     """Register error handlers for the Flask app"""
     
     @app.errorhandler(400)
     def bad_request(error):
         """Handle 400 Bad Request errors"""
-        return jsonify({
-            'error': 'Bad Request',
-            'message': 'The request could not be understood by the server',
-            'status_code': 400
-        }), 400
+        return _json_response(_BAD_REQUEST_BODY, 400)
     
     @app.errorhandler(401)
     def unauthorized(error):
         """Handle 401 Unauthorized errors"""
-        return jsonify({
-            'error': 'Unauthorized',
-            'message': 'Authentication is required to access this resource',
-            'status_code': 401
-        }), 401
+        return _json_response(_UNAUTHORIZED_BODY, 401)
     
     @app.errorhandler(403)
     def forbidden(error):
         """Handle 403 Forbidden errors"""
-        return jsonify({
-            'error': 'Forbidden',
-            'message': 'You do not have permission to access this resource',
-            'status_code': 403
-        }), 403
+        return _json_response(_FORBIDDEN_BODY, 403)
     
     @app.errorhandler(404)
     def not_found(error):
         """Handle 404 Not Found errors"""
-        return jsonify({
-            'error': 'Not Found',
-            'message': 'The requested resource was not found',
-            'status_code': 404
-        }), 404
+        return _json_response(_NOT_FOUND_BODY, 404)
     
     @app.errorhandler(405)
     def method_not_allowed(error):
         """Handle 405 Method Not Allowed errors"""
-        return jsonify({
-            'error': 'Method Not Allowed',
-            'message': 'The method is not allowed for the requested URL',
-            'status_code': 405
-        }), 405
+        return _json_response(_METHOD_NOT_ALLOWED_BODY, 405)
     
     @app.errorhandler(409)
     def conflict(error):
         """Handle 409 Conflict errors"""
-        return jsonify({
-            'error': 'Conflict',
-            'message': 'The request could not be completed due to a conflict',
-            'status_code': 409
-        }), 409
+        return _json_response(_CONFLICT_BODY, 409)
     
     @app.errorhandler(422)
     def unprocessable_entity(error):
         """Handle 422 Unprocessable Entity errors"""
-        return jsonify({
-            'error': 'Unprocessable Entity',
-            'message': 'The request was well-formed but contains semantic errors',
-            'status_code': 422
-        }), 422
+        return _json_response(_UNPROCESSABLE_ENTITY_BODY, 422)
     
     @app.errorhandler(429)
     def rate_limit_exceeded(error):
         """Handle 429 Too Many Requests errors"""
-        return jsonify({
-            'error': 'Rate Limit Exceeded',
-            'message': 'Too many requests. Please try again later',
-            'status_code': 429
-        }), 429
+        return _json_response(_RATE_LIMIT_EXCEEDED_BODY, 429)
     
     @app.errorhandler(500)
     def internal_server_error(error):
         """Handle 500 Internal Server Error"""
         logger.error(f"Internal server error: {str(error)}")
-        return jsonify({
-            'error': 'Internal Server Error',
-            'message': 'An unexpected error occurred on the server',
-            'status_code': 500
-        }), 500
+        return _json_response(_INTERNAL_SERVER_ERROR_BODY, 500)
     
     @app.errorhandler(502)
     def bad_gateway(error):
         """Handle 502 Bad Gateway errors"""
-        return jsonify({
-            'error': 'Bad Gateway',
-            'message': 'The server received an invalid response from an upstream server',
-            'status_code': 502
-        }), 502
+        return _json_response(_BAD_GATEWAY_BODY, 502)
     
     @app.errorhandler(503)
     def service_unavailable(error):
         """Handle 503 Service Unavailable errors"""
-        return jsonify({
-            'error': 'Service Unavailable',
-            'message': 'The service is temporarily unavailable. Please try again later',
-            'status_code': 503
-        }), 503
+        return _json_response(_SERVICE_UNAVAILABLE_BODY, 503)
     
     @app.errorhandler(HTTPException)
     def handle_http_exception(error):
@@ -121,21 +101,13 @@ def register_error_handlers(app):
     def handle_jwt_exceptions(error):
         """Handle JWT-related exceptions"""
         logger.warning(f"JWT error: {str(error)}")
-        return jsonify({
-            'error': 'Authentication Error',
-            'message': 'Invalid or expired authentication token',
-            'status_code': 401
-        }), 401
+        return _json_response(_AUTHENTICATION_ERROR_BODY, 401)
     
     @app.errorhandler(ValueError)
     def handle_value_error(error):
         """Handle ValueError exceptions"""
         logger.error(f"Value error: {str(error)}")
-        return jsonify({
-            'error': 'Invalid Value',
-            'message': 'Invalid input value provided',
-            'status_code': 400
-        }), 400
+        return _json_response(_INVALID_VALUE_BODY, 400)
     
     @app.errorhandler(KeyError)
     def handle_key_error(error):
@@ -151,9 +123,5 @@ def register_error_handlers(app):
     def handle_generic_exception(error):
         """Handle any unhandled exceptions"""
         logger.error(f"Unhandled exception: {str(error)}", exc_info=True)
-        return jsonify({
-            'error': 'Internal Server Error',
-            'message': 'An unexpected error occurred',
-            'status_code': 500
-        }), 500
+        return _json_response(_UNHANDLED_EXCEPTION_BODY, 500)
 
@@ -0,0 +1,83 @@
+import os
+import queue
+import logging
+import atexit
+import threading
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
+
+
+class BufferedRotatingFileHandler(RotatingFileHandler):
+    """
+    RotatingFileHandler that writes through a large buffer and flushes on a
+    timer instead of after every record.
+    """
+
+    def __init__(self, filename, buffer_size=65536, flush_interval=30.0, **kwargs):
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self._bytes_written = 0
+        self._flush_timer = None
+        super().__init__(filename, **kwargs)
+        self._schedule_flush()
+
+    def _open(self):
+        stream = open(self.baseFilename, self.mode, buffering=self.buffer_size,
+                      encoding=self.encoding, errors=self.errors)
+        self._bytes_written = os.path.getsize(self.baseFilename)
+        return stream
+
+    def _encoded_length(self, msg):
+        """Size of msg on disk; maxBytes counts bytes, not characters"""
+        return len(msg.encode(self.encoding or 'utf-8'))
+
+    def shouldRollover(self, record):
+        """Track the file size ourselves; seeking the stream would flush the buffer."""
+        if self.stream is None:
+            self.stream = self._open()
+        if self.maxBytes > 0:
+            msg = "%s\n" % self.format(record)
+            if self._bytes_written + self._encoded_length(msg) >= self.maxBytes:
+                return True
+        return False
+
+    def emit(self, record):
+        try:
+            if self.shouldRollover(record):
+                self.doRollover()
+            msg = self.format(record) + self.terminator
+            self.stream.write(msg)
+            self._bytes_written += self._encoded_length(msg)
+        except Exception:
+            self.handleError(record)
+
+    def _schedule_flush(self):
+        self._flush_timer = threading.Timer(self.flush_interval, self._timed_flush)
+        self._flush_timer.daemon = True
+        self._flush_timer.start()
+
+    def _timed_flush(self):
+        self.flush()
+        self._schedule_flush()
+
+    def close(self):
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+        super().close()
+
+
+def setup_file_logging(app, log_file_path, level):
+    """Route the app logger through a queue to a buffered rotating file handler"""
+    file_handler = BufferedRotatingFileHandler(log_file_path, maxBytes=1024 * 1024, backupCount=10)
+    file_handler.setFormatter(logging.Formatter(
+        '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
+    ))
+    file_handler.setLevel(level)
+
+    # Request threads only enqueue records; the listener thread does the file I/O
+    log_queue = queue.Queue(-1)
+    listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    app.logger.addHandler(QueueHandler(log_queue))
+    return listener
@@ -5,15 +5,21 @@ from functools import wraps
 
 logger = logging.getLogger(__name__)
 
+BODY_METHODS = frozenset(('POST', 'PUT', 'PATCH'))
+SENSITIVE_PATHS = frozenset(('/api/auth/login', '/api/auth/register'))
+MAX_LOGGED_BODY_SIZE = 4096
+
 def setup_request_logging(app):
     """Setup request logging for the Flask app"""
     
     @app.before_request
     def before_request():
-        print(f"*** BEFORE REQUEST: {request.method} {request.url} ***")
         """Log request start and set timing"""
         g.start_time = time.time()
         
+        if not logger.isEnabledFor(logging.INFO):
+            return
+        
         # Log request details (excluding sensitive data)
         log_data = {
             'method': request.method,
@@ -22,44 +28,42 @@ def setup_request_logging(app):
             'user_agent': request.headers.get('User-Agent', 'Unknown')
         }
         
-        # Don't log sensitive endpoints in detail
-        sensitive_endpoints = ['/api/auth/login', '/api/auth/register']
-        if request.endpoint not in sensitive_endpoints:
-            # ONLY try to get JSON if it's a POST, PUT, or PATCH request
-            if request.method in ['POST', 'PUT', 'PATCH'] and request.is_json and request.data:
-                try:
-                    body = request.get_json()
-                    if body and isinstance(body, dict):
-                        safe_body = {k: v for k, v in body.items() if 'password' not in k.lower()}
-                        log_data['body'] = safe_body
-                except Exception as e:
-                    # Log the error but don't re-raise, let the request continue
-                    logger.warning(f"Failed to parse JSON body in before_request: {e}")
+        # Request bodies are only logged at DEBUG, never for sensitive endpoints or large payloads
+        if (logger.isEnabledFor(logging.DEBUG)
+                and request.method in BODY_METHODS
+                and request.path not in SENSITIVE_PATHS
+                and request.is_json
+                and 0 < (request.content_length or 0) <= MAX_LOGGED_BODY_SIZE):
+            # Parsed body is cached on the request, so views reuse it
+            body = request.get_json(silent=True)
+            if body and isinstance(body, dict):
+                log_data['body'] = {k: v for k, v in body.items() if 'password' not in k.lower()}
         
-        logger.info(f"Request started: {log_data}")
+        logger.info("Request started: %s", log_data)
     
     @app.after_request
     def after_request(response):
-
-        print(f"*** AFTER REQUEST: {request.method} {request.url} Status: {response.status_code} ***")
         """Log request completion and timing"""
         if hasattr(g, 'start_time'):
-            duration = time.time() - g.start_time
-            
-            log_data = {
-                'method': request.method,
-                'url': request.url,
-                'status_code': response.status_code,
-                'duration_ms': round(duration * 1000, 2)
-            }
-            
             # Log level based on status code
             if response.status_code >= 500:
-                logger.error(f"Request completed: {log_data}")
+                level = logging.ERROR
             elif response.status_code >= 400:
-                logger.warning(f"Request completed: {log_data}")
+                level = logging.WARNING
             else:
-                logger.info(f"Request completed: {log_data}")
+                level = logging.INFO
+            
+            if logger.isEnabledFor(level):
+                duration = time.time() - g.start_time
+                
+                log_data = {
+                    'method': request.method,
+                    'url': request.url,
+                    'status_code': response.status_code,
+                    'duration_ms': round(duration * 1000, 2)
+                }
+                
+                logger.log(level, "Request completed: %s", log_data)
         
         return response
 
@@ -1,18 +1,21 @@
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
+from sqlalchemy import DDL, event
+from sqlalchemy.sql import func
 from src.models.user import db
 
 class Farm(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.String(500))
     latitude = db.Column(db.Float, nullable=False)
     longitude = db.Column(db.Float, nullable=False)
     area = db.Column(db.Float)  # in hectares
     crop_type = db.Column(db.String(50))
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # The database supplies the timestamps; the INSERT-side default also covers tables created
+    # before the server default was declared
+    created_at = db.Column(db.DateTime, default=func.now(), server_default=func.now())
+    updated_at = db.Column(db.DateTime, default=func.now(), server_default=func.now(), onupdate=func.now())
 
     # Relationship with User
     user = db.relationship('User', backref=db.backref('farms', lazy=True))
@@ -30,7 +33,15 @@ class Farm(db.Model):
             'longitude': self.longitude,
             'area': self.area,
             'crop_type': self.crop_type,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
         }
 
+# Trigram GIN indexes let PostgreSQL answer the search endpoint's '%term%' ILIKE
+# matches from an index instead of a sequential scan; other databases skip them
+for _column in (Farm.name, Farm.crop_type):
+    _index = db.Index(
+        f'ix_farm_{_column.key}_trgm', _column,
+        postgresql_using='gin', postgresql_ops={_column.key: 'gin_trgm_ops'}
+    ).ddl_if(dialect='postgresql')
+    event.listen(_index, 'before_create', DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql'))
@@ -1,5 +1,6 @@
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
+from sqlalchemy import inspect
+from sqlalchemy.sql import func
 from src.models.user import db
 import json
 
@@ -11,7 +12,9 @@ class SoilAnalysis(db.Model):
     depth = db.Column(db.String(10), nullable=False)  # e.g., "0-20", "20-50"
     soil_properties = db.Column(db.JSON, nullable=False)  # Store all iSDA API response data
     analyzed_at = db.Column(db.DateTime, nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    health_score = db.Column(db.JSON)  # Health score at the analysis depth, computed once when the analysis is saved
+    overall_score = db.Column(db.Float, index=True)  # health_score['overall_score'], as a column for SQL-side use
+    created_at = db.Column(db.DateTime, default=func.now(), server_default=func.now())
 
     # Relationship with Farm
     farm = db.relationship('Farm', backref=db.backref('soil_analyses', lazy=True))
@@ -20,16 +23,22 @@ class SoilAnalysis(db.Model):
         return f'<SoilAnalysis id={self.id} for Farm {self.farm_id}>'
 
     def to_dict(self):
-        return {
+        data = {
             'id': self.id,
             'farm_id': self.farm_id,
             'latitude': self.latitude,
             'longitude': self.longitude,
-            'depth': self.depth,
-            'soil_properties': self.soil_properties,
-            'analyzed_at': self.analyzed_at.isoformat() if self.analyzed_at else None,
-            'created_at': self.created_at.isoformat() if self.created_at else None
+            'depth': self.depth
         }
+        # Summary queries defer the soil_properties blob; don't lazy-load it here
+        if 'soil_properties' not in inspect(self).unloaded:
+            data['soil_properties'] = self.soil_properties
+        data['analyzed_at'] = self.analyzed_at
+        data['created_at'] = self.created_at
+        return data
+
+# Backs per-farm listings and "latest analysis" lookups, which sort newest first
+db.Index('ix_soil_farm_analyzed', SoilAnalysis.farm_id, SoilAnalysis.analyzed_at.desc())
 
 class Recommendation(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -40,7 +49,7 @@ class Recommendation(db.Model):
     dosage = db.Column(db.String(100))
     timing = db.Column(db.String(100))
     priority = db.Column(db.Integer, default=3)  # 1-5 scale
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=func.now(), server_default=func.now())
 
     # Relationship with SoilAnalysis
     soil_analysis = db.relationship('SoilAnalysis', backref=db.backref('recommendations', lazy=True))
@@ -58,6 +67,15 @@ class Recommendation(db.Model):
             'dosage': self.dosage,
             'timing': self.timing,
             'priority': self.priority,
-            'created_at': self.created_at.isoformat() if self.created_at else None
+            'created_at': self.created_at
         }
 
+# Serves both analysis_id lookups and priority-ordered recommendation lists
+db.Index('ix_recommendation_analysis_priority', Recommendation.soil_analysis_id, Recommendation.priority)
+
+# Partial index over just the high-priority rows counted by the dashboard, statistics and health summary
+db.Index(
+    'ix_recommendation_high_priority', Recommendation.soil_analysis_id,
+    postgresql_where=Recommendation.priority <= 2,
+    sqlite_where=Recommendation.priority <= 2
+)
@@ -34,6 +34,6 @@ class User(db.Model):
             'full_name': self.full_name,
             'phone_number': self.phone_number,
             'is_active': self.is_active,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
         }
@@ -1,6 +1,7 @@
 from flask import Blueprint, jsonify, request, current_app
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity, create_refresh_token
+from flask_jwt_extended import create_access_token, jwt_required, create_refresh_token
 from src.models.user import User, db
+from src.utils.auth import current_uid
 from datetime import timedelta
 import re
 
@@ -124,8 +125,8 @@ def login():
 def refresh():
     """Refresh access token endpoint"""
     try:
-        current_user_id = int(get_jwt_identity())
-        user = User.query.get(current_user_id)
+        current_user_id = current_uid()
+        user = db.session.get(User, current_user_id)
         
         if not user or not user.is_active:
             return jsonify({'error': 'User not found or inactive'}), 404
@@ -148,8 +149,8 @@ def refresh():
 def get_current_user():
     """Get current user information"""
     try:
-        current_user_id = int(get_jwt_identity())
-        user = User.query.get(current_user_id)
+        current_user_id = current_uid()
+        user = db.session.get(User, current_user_id)
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
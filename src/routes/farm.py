@@ -1,35 +1,60 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, Response, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from src.models.user import User, db
+from sqlalchemy import select, insert, func
+from src.models.user import db
 from src.models.farm import Farm
-import traceback
+from src.models.soil_analysis import SoilAnalysis
+from src.extensions import cache, invalidate_dashboard
+from src.utils.auth import current_uid, user_exists
+import orjson
 from datetime import datetime
 
 farm_bp = Blueprint('farm', __name__)
 
+# Validation error payloads shared by create_farm and update_farm
+LATITUDE_RANGE_ERROR = {'error': 'Latitude must be between -90 and 90'}
+LONGITUDE_RANGE_ERROR = {'error': 'Longitude must be between -180 and 180'}
+AREA_RANGE_ERROR = {'error': 'Area must be positive'}
+AREA_FORMAT_ERROR = {'error': 'Invalid area format'}
+
+def _to_float(value):
+    """Coerce a JSON value to float, returning None if it is not numeric"""
+    # JSON numbers are already int/float, so skip the try/except for them
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return None
+
+@cache.memoize(timeout=60)
+def _user_farms_payload(user_id):
+    """Serialize a user's farms straight from column rows, skipping ORM hydration"""
+    rows = db.session.execute(
+        select(
+            Farm.id, Farm.user_id, Farm.name, Farm.description,
+            Farm.latitude, Farm.longitude, Farm.area, Farm.crop_type,
+            Farm.created_at, Farm.updated_at
+        ).where(Farm.user_id == user_id)
+    ).all()
+    
+    return orjson.dumps({
+        'farms': [row._asdict() for row in rows],
+        'total': len(rows)
+    })
+
 @farm_bp.route('/farms', methods=['GET'])
 @jwt_required()
 def get_user_farms():
     """Get all farms for the current user"""
     try:
-        jwt_identity = get_jwt_identity()
-        
-        current_user_id = int(jwt_identity)
-        user = User.query.get(current_user_id)
+        current_user_id = current_uid()
         
-        if not user:
-            return jsonify({'error': 'User not found'}), 404
-        
-        farms = Farm.query.filter_by(user_id=current_user_id).all()
-        
-        return jsonify({
-            'farms': [farm.to_dict() for farm in farms],
-            'total': len(farms)
-        }), 200
+        return Response(_user_farms_payload(current_user_id), status=200, mimetype='application/json')
 
         
     except Exception as e:
-        print(f"Error in get_user_farms: {e}")
+        current_app.logger.exception("get_user_farms failed for user %s", get_jwt_identity())
         return jsonify({'error': 'Failed to get farms', 'details': str(e)}), 500
 
 @farm_bp.route('/farms', methods=['POST'])
@@ -37,10 +62,9 @@ def get_user_farms():
 def create_farm():
     """Create a new farm"""
     try:
-        current_user_id = int(get_jwt_identity())
-        user = User.query.get(current_user_id)
+        current_user_id = current_uid()
         
-        if not user:
+        if not user_exists(current_user_id):
             return jsonify({'error': 'User not found'}), 404
         
         data = request.get_json()
@@ -52,46 +76,49 @@ def create_farm():
                 return jsonify({'error': f'{field} is required'}), 400
         
         # Validate coordinates
-        try:
-            latitude = float(data['latitude'])
-            longitude = float(data['longitude'])
-            
-            if not (-90 <= latitude <= 90):
-                return jsonify({'error': 'Latitude must be between -90 and 90'}), 400
-            if not (-180 <= longitude <= 180):
-                return jsonify({'error': 'Longitude must be between -180 and 180'}), 400
-                
-        except (ValueError, TypeError):
+        latitude = _to_float(data['latitude'])
+        longitude = _to_float(data['longitude'])
+        if latitude is None or longitude is None:
             return jsonify({'error': 'Invalid latitude or longitude format'}), 400
+        if not -90.0 <= latitude <= 90.0:
+            return jsonify(LATITUDE_RANGE_ERROR), 400
+        if not -180.0 <= longitude <= 180.0:
+            return jsonify(LONGITUDE_RANGE_ERROR), 400
         
         # Validate area if provided
         area = data.get('area')
         if area is not None:
-            try:
-                area = float(area)
-                if area <= 0:
-                    return jsonify({'error': 'Area must be positive'}), 400
-            except (ValueError, TypeError):
-                return jsonify({'error': 'Invalid area format'}), 400
-        
-        # Create new farm
-        farm = Farm()
-        
-        farm.user_id=current_user_id
-        farm.name=data['name'].strip()
-        farm.description=str(data.get('description', '')).strip()
-        farm.latitude=latitude
-        farm.longitude=longitude
-        farm.area=area
-        farm.crop_type=str(data.get('crop_type', '')).strip()
-        
+            area = _to_float(area)
+            if area is None:
+                return jsonify(AREA_FORMAT_ERROR), 400
+            if area <= 0:
+                return jsonify(AREA_RANGE_ERROR), 400
+        
+        # Create new farm; RETURNING hands back the generated columns without a refresh SELECT
+        farm_data = {
+            'user_id': current_user_id,
+            'name': data['name'].strip(),
+            'description': str(data.get('description', '')).strip(),
+            'latitude': latitude,
+            'longitude': longitude,
+            'area': area,
+            'crop_type': str(data.get('crop_type', '')).strip()
+        }
         
-        db.session.add(farm)
+        farm_id, created_at, updated_at = db.session.execute(
+            insert(Farm).values(**farm_data).returning(Farm.id, Farm.created_at, Farm.updated_at)
+        ).one()
         db.session.commit()
+        cache.delete_memoized(_user_farms_payload, current_user_id)
+        invalidate_dashboard(current_user_id)
+        
+        farm_data['id'] = farm_id
+        farm_data['created_at'] = created_at
+        farm_data['updated_at'] = updated_at
         
         return jsonify({
             'message': 'Farm created successfully',
-            'farm': farm.to_dict()
+            'farm': farm_data
         }), 201
         
     except Exception as e:
@@ -103,11 +130,11 @@ def create_farm():
 def get_farm(farm_id):
     """Get a specific farm by ID"""
     try:
-        current_user_id = int(get_jwt_identity())
+        current_user_id = current_uid()
         
-        farm = Farm.query.filter_by(id=farm_id, user_id=current_user_id).first()
+        farm = db.session.get(Farm, farm_id)
         
-        if not farm:
+        if not farm or farm.user_id != current_user_id:
             return jsonify({'error': 'Farm not found'}), 404
         
         return jsonify({
@@ -122,11 +149,11 @@ def get_farm(farm_id):
 def update_farm(farm_id):
     """Update a farm"""
     try:
-        current_user_id = int(get_jwt_identity())
+        current_user_id = current_uid()
         
-        farm = Farm.query.filter_by(id=farm_id, user_id=current_user_id).first()
+        farm = db.session.get(Farm, farm_id)
         
-        if not farm:
+        if not farm or farm.user_id != current_user_id:
             return jsonify({'error': 'Farm not found'}), 404
         
         data = request.get_json()
@@ -139,32 +166,29 @@ def update_farm(farm_id):
             farm.description = data['description'].strip()
         
         if 'latitude' in data:
-            try:
-                latitude = float(data['latitude'])
-                if not (-90 <= latitude <= 90):
-                    return jsonify({'error': 'Latitude must be between -90 and 90'}), 400
-                farm.latitude = latitude
-            except (ValueError, TypeError):
+            latitude = _to_float(data['latitude'])
+            if latitude is None:
                 return jsonify({'error': 'Invalid latitude format'}), 400
+            if not -90.0 <= latitude <= 90.0:
+                return jsonify(LATITUDE_RANGE_ERROR), 400
+            farm.latitude = latitude
         
         if 'longitude' in data:
-            try:
-                longitude = float(data['longitude'])
-                if not (-180 <= longitude <= 180):
-                    return jsonify({'error': 'Longitude must be between -180 and 180'}), 400
-                farm.longitude = longitude
-            except (ValueError, TypeError):
+            longitude = _to_float(data['longitude'])
+            if longitude is None:
                 return jsonify({'error': 'Invalid longitude format'}), 400
+            if not -180.0 <= longitude <= 180.0:
+                return jsonify(LONGITUDE_RANGE_ERROR), 400
+            farm.longitude = longitude
         
         if 'area' in data:
             if data['area'] is not None:
-                try:
-                    area = float(data['area'])
-                    if area <= 0:
-                        return jsonify({'error': 'Area must be positive'}), 400
-                    farm.area = area
-                except (ValueError, TypeError):
-                    return jsonify({'error': 'Invalid area format'}), 400
+                area = _to_float(data['area'])
+                if area is None:
+                    return jsonify(AREA_FORMAT_ERROR), 400
+                if area <= 0:
+                    return jsonify(AREA_RANGE_ERROR), 400
+                farm.area = area
             else:
                 farm.area = None
         
@@ -172,6 +196,8 @@ def update_farm(farm_id):
             farm.crop_type = data['crop_type'].strip()
         
         db.session.commit()
+        cache.delete_memoized(_user_farms_payload, current_user_id)
+        invalidate_dashboard(current_user_id)
         
         return jsonify({
             'message': 'Farm updated successfully',
@@ -187,15 +213,17 @@ def update_farm(farm_id):
 def delete_farm(farm_id):
     """Delete a farm"""
     try:
-        current_user_id = int(get_jwt_identity())
+        current_user_id = current_uid()
         
-        farm = Farm.query.filter_by(id=farm_id, user_id=current_user_id).first()
+        farm = db.session.get(Farm, farm_id)
         
-        if not farm:
+        if not farm or farm.user_id != current_user_id:
             return jsonify({'error': 'Farm not found'}), 404
         
         db.session.delete(farm)
         db.session.commit()
+        cache.delete_memoized(_user_farms_payload, current_user_id)
+        invalidate_dashboard(current_user_id)
         
         return jsonify({
             'message': 'Farm deleted successfully'
@@ -210,25 +238,23 @@ def delete_farm(farm_id):
 def get_farm_stats(farm_id):
     """Get statistics for a specific farm"""
     try:
-        current_user_id = int(get_jwt_identity())
+        current_user_id = current_uid()
         
-        farm = Farm.query.filter_by(id=farm_id, user_id=current_user_id).first()
+        farm = db.session.get(Farm, farm_id)
         
-        if not farm:
+        if not farm or farm.user_id != current_user_id:
             return jsonify({'error': 'Farm not found'}), 404
         
-        # Get soil analysis count
-        from src.models.soil_analysis import SoilAnalysis
-        soil_analysis_count = SoilAnalysis.query.filter_by(farm_id=farm_id).count()
-        
-        # Get latest soil analysis
-        latest_analysis = SoilAnalysis.query.filter_by(farm_id=farm_id)\
-            .order_by(SoilAnalysis.analyzed_at.desc()).first()
+        # Get soil analysis count and latest analysis date in one round-trip
+        soil_analysis_count, latest_analysis_date = db.session.execute(
+            select(func.count(SoilAnalysis.id), func.max(SoilAnalysis.analyzed_at))
+            .where(SoilAnalysis.farm_id == farm_id)
+        ).one()
         
         stats = {
             'farm_id': farm_id,
             'soil_analyses_count': soil_analysis_count,
-            'latest_analysis_date': latest_analysis.analyzed_at.isoformat() if latest_analysis else None,
+            'latest_analysis_date': latest_analysis_date,
             'farm_area': farm.area,
             'crop_type': farm.crop_type
         }
@@ -1,13 +1,22 @@
-from flask import Blueprint, jsonify, request
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask import Blueprint, jsonify, request, Response
+from flask_jwt_extended import jwt_required
+from sqlalchemy import select, insert, update, exists, func
+from sqlalchemy.orm import selectinload, aliased, load_only
 from src.models.user import User, db
 from src.models.farm import Farm
 from src.models.soil_analysis import SoilAnalysis, Recommendation
 from src.services.isda_service import isda_service
 from src.services.recommendation_service import recommendation_service
-from datetime import datetime
+from src.utils.auth import current_uid
+from src.utils.clock import request_now
+from src.utils.scores import ensure_health_score
+from src.extensions import cache, invalidate_dashboard
+from concurrent.futures import ThreadPoolExecutor
 import os
+import time
+import threading
 import logging
+import orjson
 
 logger = logging.getLogger(__name__)
 
@@ -17,11 +26,69 @@ soil_bp = Blueprint('soil', __name__)
 ISDA_USERNAME = os.getenv('ISDA_USERNAME', 'default_username')
 ISDA_PASSWORD = os.getenv('ISDA_PASSWORD', 'default_password')
 
+# iSDA tokens live 60 minutes (the service refreshes at 55); re-authenticate a minute before that
+ISDA_TOKEN_TTL = 55 * 60
+ISDA_TOKEN_SKEW = 60
+_isda_auth = {'expires_at': 0.0}
+_isda_auth_lock = threading.Lock()
+
+ISDA_LAYERS_CACHE_KEY = 'isda_layers'
+ISDA_LAYERS_CACHE_TIMEOUT = 3600
+
+# Runs iSDA auth refreshes off the request thread so they overlap with DB work
+_isda_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='isda-auth')
+
+# Columns serialized by the analysis list endpoint, in response key order
+ANALYSIS_LIST_COLUMNS = (
+    SoilAnalysis.id, SoilAnalysis.farm_id, SoilAnalysis.latitude, SoilAnalysis.longitude,
+    SoilAnalysis.depth, SoilAnalysis.soil_properties, SoilAnalysis.analyzed_at,
+    SoilAnalysis.created_at, SoilAnalysis.health_score
+)
+
+INVALID_COORDS_ERROR = {'error': 'Invalid or missing latitude/longitude'}
+
+def _parse_coords(data, farm):
+    """Return (latitude, longitude) from the request body, falling back to the farm's, or None if invalid"""
+    latitude = data.get('latitude', farm.latitude)
+    longitude = data.get('longitude', farm.longitude)
+    # JSON numbers are already int/float; only strings need parsing
+    if not isinstance(latitude, (int, float)) or not isinstance(longitude, (int, float)):
+        try:
+            latitude, longitude = float(latitude), float(longitude)
+        except (ValueError, TypeError):
+            return None
+    # Chained comparisons are False for NaN, so this also rejects 'nan'
+    if -90.0 <= latitude <= 90.0 and -180.0 <= longitude <= 180.0:
+        return float(latitude), float(longitude)
+    return None
+
+def _user_owns_farm(farm_id, user_id):
+    """Check farm ownership with an EXISTS query instead of loading the Farm row"""
+    return db.session.scalar(
+        select(exists().where(Farm.id == farm_id, Farm.user_id == user_id))
+    )
+
+def _user_owns_analysis(analysis_id, user_id):
+    """Check that a soil analysis belongs to one of the user's farms without loading it"""
+    return db.session.scalar(
+        select(exists().where(
+            SoilAnalysis.id == analysis_id,
+            SoilAnalysis.farm_id == Farm.id,
+            Farm.user_id == user_id
+        ))
+    )
+
 def _authenticate_isda():
-    """Helper function to handle iSDA authentication."""
-    if not isda_service._is_token_valid():
+    """Helper function to handle iSDA authentication, skipped while the cached token is fresh."""
+    if time.monotonic() < _isda_auth['expires_at']:
+        return True
+    with _isda_auth_lock:
+        # Another thread may have refreshed the token while we waited
+        if time.monotonic() < _isda_auth['expires_at']:
+            return True
         if not isda_service.authenticate(ISDA_USERNAME, ISDA_PASSWORD):
             return False
+        _isda_auth['expires_at'] = time.monotonic() + ISDA_TOKEN_TTL - ISDA_TOKEN_SKEW
     return True
 
 @soil_bp.route('/farms/<int:farm_id>/soil-analysis', methods=['POST'])
@@ -32,25 +99,28 @@ def analyze_soil(farm_id):
     This endpoint now fetches all available soil data in a single API call.
     """
     try:
-        current_user_id = int(get_jwt_identity())
-        farm = Farm.query.filter_by(id=farm_id, user_id=current_user_id).first()
+        current_user_id = current_uid()
+        # Start the iSDA token check/refresh while the farm lookup runs
+        isda_auth = _isda_executor.submit(_authenticate_isda)
+        
+        # Only the columns the analysis needs, not a full Farm object
+        farm = db.session.execute(
+            select(Farm.crop_type, Farm.latitude, Farm.longitude)
+            .where(Farm.id == farm_id, Farm.user_id == current_user_id)
+        ).first()
         if not farm:
             return jsonify({'error': 'Farm not found or unauthorized'}), 404
         
-        data = request.get_json() or {}
-        latitude = data.get('latitude', farm.latitude)
-        longitude = data.get('longitude', farm.longitude)
+        data = request.get_json(silent=True, cache=False) or {}
         analysis_depth = data.get('depth', '0-20')
         
-        try:
-            latitude, longitude = float(latitude), float(longitude)
-            if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
-                raise ValueError("Invalid coordinates.")
-        except (ValueError, TypeError):
-            return jsonify({'error': 'Invalid or missing latitude/longitude'}), 400
+        coords = _parse_coords(data, farm)
+        if coords is None:
+            return jsonify(INVALID_COORDS_ERROR), 400
+        latitude, longitude = coords
         
         # Ensure we are authenticated with the iSDA service
-        if not _authenticate_isda():
+        if not isda_auth.result():
             return jsonify({'error': 'Failed to authenticate with external soil data service'}), 503
         
         # Fetch all soil properties in a single, efficient call
@@ -69,32 +139,47 @@ def analyze_soil(farm_id):
         soil_analysis.longitude=longitude
         soil_analysis.depth=analysis_depth
         soil_analysis.soil_properties=soil_properties
-        soil_analysis.analyzed_at=datetime.utcnow()
+        soil_analysis.analyzed_at=request_now()
+        
+        # Build the topsoil (0-20cm) recommendations and score it in one pass over the properties.
+        # The stored score is the one at the analysis depth; it is set before flush so it rides on the INSERT
+        recommendations_data, health_score = recommendation_service.analyze(
+            soil_properties, crop_type=farm.crop_type, depth="0-20"
+        )
+        if analysis_depth != "0-20":
+            health_score = recommendation_service.get_soil_health_score(soil_properties, depth=analysis_depth)
+        soil_analysis.health_score = health_score
+        soil_analysis.overall_score = health_score['overall_score']
         
         db.session.add(soil_analysis)
         db.session.flush()  # Flush to get the new soil_analysis.id
 
-        # Generate recommendations based on the full topsoil (0-20cm) data
-        recommendations_data = recommendation_service.generate_recommendations(
-            soil_properties, 
-            crop_type=farm.crop_type,
-            depth="0-20"  # Specify topsoil for main recommendations
-        )
-        
-        # Save recommendations
+        # Save recommendations with a single bulk INSERT; RETURNING fills in the generated
+        # columns so the response is built from memory rather than re-selected
         for rec_data in recommendations_data:
             rec_data['soil_analysis_id'] = soil_analysis.id
-            db.session.add(Recommendation(**rec_data))
+        if recommendations_data:
+            generated = db.session.execute(
+                insert(Recommendation).returning(
+                    Recommendation.id, Recommendation.created_at, sort_by_parameter_order=True
+                ),
+                recommendations_data
+            )
+            for rec_data, (rec_id, created_at) in zip(recommendations_data, generated):
+                rec_data['id'] = rec_id
+                rec_data['created_at'] = created_at
         
-        db.session.commit()
+        # Serialize before commit, which would expire the instance and force a refresh SELECT
+        analysis_dict = soil_analysis.to_dict()
+        analysis_id = soil_analysis.id
         
-        # Calculate soil health score for the topsoil
-        health_score = recommendation_service.get_soil_health_score(soil_properties, depth="0-20")
+        db.session.commit()
+        invalidate_dashboard(current_user_id)
         
         return jsonify({
             'message': 'Soil analysis completed successfully',
-            'analysis': soil_analysis.to_dict(), 
-            'analysis_id': soil_analysis.id,
+            'analysis': analysis_dict, 
+            'analysis_id': analysis_id,
             'health_score': health_score,
             'recommendations': recommendations_data,
         }), 201
@@ -112,29 +197,38 @@ def get_all_user_soil_analyses():
     Get all soil analyses for all farms belonging to the current user.
     """
     try:
-        current_user_id = int(get_jwt_identity())
-        
-        analyses_from_db = SoilAnalysis.query.join(Farm).filter(
-            Farm.user_id == current_user_id
-        ).order_by(SoilAnalysis.analyzed_at.desc()).all()
-        
-        results = []
-        for analysis in analyses_from_db:
-            # Convert the DB object to a dictionary
-            analysis_dict = analysis.to_dict()
-            
-            # Calculate the health score on-the-fly for this analysis
-            health_score = recommendation_service.get_soil_health_score(
-                analysis.soil_properties,
-                analysis.depth
+        current_user_id = current_uid()
+        
+        # Column tuples instead of ORM rows: no identity map or per-row to_dict()
+        rows = db.session.execute(
+            select(*ANALYSIS_LIST_COLUMNS, SoilAnalysis.overall_score).join(Farm)
+            .where(Farm.user_id == current_user_id)
+            .order_by(SoilAnalysis.analyzed_at.desc())
+        ).all()
+        
+        results = [row._asdict() for row in rows]
+        
+        # Backfill scores for analyses saved before they were persisted, in one executemany UPDATE.
+        # overall_score is only selected to spot those rows and is not part of the response.
+        missing = [result for result in results if result.pop('overall_score') is None or result['health_score'] is None]
+        if missing:
+            for result in missing:
+                if result['health_score'] is None:
+                    result['health_score'] = recommendation_service.get_soil_health_score(result['soil_properties'], depth=result['depth'])
+            db.session.execute(
+                update(SoilAnalysis),
+                [
+                    {
+                        'id': result['id'],
+                        'health_score': result['health_score'],
+                        'overall_score': result['health_score']['overall_score']
+                    }
+                    for result in missing
+                ]
             )
+            db.session.commit()
             
-            # Add the calculated score to the dictionary
-            analysis_dict['health_score'] = health_score
-            
-            results.append(analysis_dict)
-            
-        return jsonify({'analyses': results}), 200
+        return Response(orjson.dumps({'analyses': results}), status=200, mimetype='application/json')
         
     except Exception as e:
         logger.error(f"Error getting all user soil analyses: {e}", exc_info=True)
@@ -146,26 +240,44 @@ def get_all_user_soil_analyses():
 def get_farm_soil_analyses(farm_id):
     """Get all soil analyses for a farm"""
     try:
-        current_user_id = int(get_jwt_identity())
+        current_user_id = current_uid()
         
         # Verify farm ownership
-        farm = Farm.query.filter_by(id=farm_id, user_id=current_user_id).first()
-        if not farm:
+        if not _user_owns_farm(farm_id, current_user_id):
             return jsonify({'error': 'Farm not found'}), 404
         
         # Get query parameters
         limit = request.args.get('limit', 10, type=int)
         offset = request.args.get('offset', 0, type=int)
-        
-        # Get soil analyses with pagination
-        analyses = SoilAnalysis.query.filter_by(farm_id=farm_id)\
-            .order_by(SoilAnalysis.analyzed_at.desc())\
-            .limit(limit).offset(offset).all()
-        
-        total_count = SoilAnalysis.query.filter_by(farm_id=farm_id).count()
+        include_properties = request.args.get('include_properties', 'true').lower() != 'false'
+        
+        # Get a page of soil analyses plus the overall count in one query via COUNT(*) OVER ()
+        stmt = (
+            select(SoilAnalysis, func.count().over().label('total'))
+            .where(SoilAnalysis.farm_id == farm_id)
+            .order_by(SoilAnalysis.analyzed_at.desc())
+            .limit(limit).offset(offset)
+        )
+        if not include_properties:
+            # Clients that opt out leave the multi-KB soil_properties JSON in the database
+            stmt = stmt.options(load_only(
+                SoilAnalysis.id, SoilAnalysis.farm_id, SoilAnalysis.latitude, SoilAnalysis.longitude,
+                SoilAnalysis.depth, SoilAnalysis.analyzed_at, SoilAnalysis.created_at
+            ))
+        rows = db.session.execute(stmt).all()
+        
+        if rows:
+            total_count = rows[0].total
+        elif offset > 0:
+            # Page past the end: no rows to carry the window count, so count separately
+            total_count = db.session.scalar(
+                select(func.count(SoilAnalysis.id)).where(SoilAnalysis.farm_id == farm_id)
+            )
+        else:
+            total_count = 0
         
         return jsonify({
-            'analyses': [analysis.to_dict() for analysis in analyses],
+            'analyses': [row.SoilAnalysis.to_dict() for row in rows],
             'total': total_count,
             'limit': limit,
             'offset': offset
@@ -181,22 +293,27 @@ def get_farm_soil_analyses(farm_id):
 def get_soil_analysis(analysis_id):
     """Get a specific soil analysis with its stored properties, recommendations, and health score."""
     try:
-        current_user_id = int(get_jwt_identity())
-        analysis = SoilAnalysis.query.join(Farm).filter(
-            SoilAnalysis.id == analysis_id, Farm.user_id == current_user_id
+        current_user_id = current_uid()
+        analysis = db.session.scalars(
+            select(SoilAnalysis).options(selectinload(SoilAnalysis.recommendations))
+            .join(Farm)
+            .where(SoilAnalysis.id == analysis_id, Farm.user_id == current_user_id)
         ).first()
         
         if not analysis:
             return jsonify({'error': 'Soil analysis not found or unauthorized'}), 404
         
-        # Recalculate health score on-the-fly or store it. Here we recalculate.
-        health_score = recommendation_service.get_soil_health_score(analysis.soil_properties, depth="0-20")
-        
-        return jsonify({
+        analysis_data = {
             'analysis': analysis.to_dict(), # Assumes to_dict() correctly serializes the object
             'recommendations': [rec.to_dict() for rec in analysis.recommendations],
-            'health_score': health_score
-        }), 200
+            'health_score': ensure_health_score(analysis)
+        }
+        
+        # Persist a score backfilled for an older analysis
+        if db.session.dirty:
+            db.session.commit()
+        
+        return jsonify(analysis_data), 200
         
     except Exception as e:
         logger.error(f"Error getting soil analysis {analysis_id}: {e}", exc_info=True)
@@ -207,19 +324,18 @@ def get_soil_analysis(analysis_id):
 def get_analysis_recommendations(analysis_id):
     """Get recommendations for a specific soil analysis"""
     try:
-        current_user_id = int(get_jwt_identity())
+        current_user_id = current_uid()
         
-        # Get soil analysis and verify ownership
-        analysis = SoilAnalysis.query.join(Farm)\
-            .filter(SoilAnalysis.id == analysis_id, Farm.user_id == current_user_id)\
-            .first()
-        
-        if not analysis:
+        # Verify soil analysis ownership
+        if not _user_owns_analysis(analysis_id, current_user_id):
             return jsonify({'error': 'Soil analysis not found'}), 404
         
         # Get recommendations sorted by priority
-        recommendations = Recommendation.query.filter_by(soil_analysis_id=analysis_id)\
-            .order_by(Recommendation.priority.asc()).all()
+        recommendations = db.session.scalars(
+            select(Recommendation)
+            .where(Recommendation.soil_analysis_id == analysis_id)
+            .order_by(Recommendation.priority.asc())
+        ).all()
         
         return jsonify({
             'recommendations': [rec.to_dict() for rec in recommendations],
@@ -237,43 +353,55 @@ def get_analysis_recommendations(analysis_id):
 def get_farm_soil_health_summary(farm_id):
     """Get soil health summary for a farm"""
     try:
-        current_user_id = int(get_jwt_identity())
+        current_user_id = current_uid()
         
         # Verify farm ownership
-        farm = Farm.query.filter_by(id=farm_id, user_id=current_user_id).first()
-        if not farm:
+        if not _user_owns_farm(farm_id, current_user_id):
             return jsonify({'error': 'Farm not found'}), 404
         
-        # Get latest soil analysis
-        latest_analysis = SoilAnalysis.query.filter_by(farm_id=farm_id)\
-            .order_by(SoilAnalysis.analyzed_at.desc()).first()
+        # Get the latest soil analysis, its high priority recommendation count and the
+        # farm's total analysis count in a single query
+        all_analyses = aliased(SoilAnalysis)
+        total_analyses_subquery = select(func.count(all_analyses.id))\
+            .where(all_analyses.farm_id == farm_id).scalar_subquery()
+        
+        row = db.session.execute(
+            select(
+                SoilAnalysis,
+                func.count(Recommendation.id).filter(Recommendation.priority <= 2).label('high_priority_count'),
+                total_analyses_subquery.label('total_analyses')
+            )
+            .outerjoin(Recommendation, Recommendation.soil_analysis_id == SoilAnalysis.id)
+            .where(SoilAnalysis.farm_id == farm_id)
+            .group_by(SoilAnalysis.id)
+            .order_by(SoilAnalysis.analyzed_at.desc())
+            .limit(1)
+        ).first()
         
-        if not latest_analysis:
+        if not row:
             return jsonify({
                 'message': 'No soil analysis available for this farm',
                 'farm_id': farm_id,
                 'has_analysis': False
             }), 200
         
-        # Calculate health score
-        health_score = recommendation_service.get_soil_health_score(latest_analysis.soil_properties)
-        
-        # Get high priority recommendations count
-        high_priority_count = Recommendation.query.filter_by(
-            soil_analysis_id=latest_analysis.id
-        ).filter(Recommendation.priority <= 2).count()
+        latest_analysis, high_priority_count, total_analyses = row
+        health_score = ensure_health_score(latest_analysis)
         
-        # Get total analyses count
-        total_analyses = SoilAnalysis.query.filter_by(farm_id=farm_id).count()
-        
-        return jsonify({
+        summary = {
             'farm_id': farm_id,
             'has_analysis': True,
-            'latest_analysis_date': latest_analysis.analyzed_at.isoformat(),
+            'latest_analysis_date': latest_analysis.analyzed_at,
             'health_score': health_score,
             'high_priority_recommendations': high_priority_count,
             'total_analyses': total_analyses
-        }), 200
+        }
+        
+        # Persist a score backfilled for an older analysis
+        if db.session.dirty:
+            db.session.commit()
+        
+        return jsonify(summary), 200
         
     except Exception as e:
         logger.error(f"Error getting soil health summary: {str(e)}")
@@ -287,6 +415,11 @@ def get_farm_soil_health_summary(farm_id):
 def get_isda_layers():
     """Get available soil property layers from iSDA API."""
     try:
+        # The layer catalog is effectively static; serve repeats without touching iSDA
+        layers_data = cache.get(ISDA_LAYERS_CACHE_KEY)
+        if layers_data is not None:
+            return jsonify(layers_data), 200
+        
         if not _authenticate_isda():
             return jsonify({'error': 'Failed to authenticate with soil data service'}), 503
         
@@ -294,6 +427,7 @@ def get_isda_layers():
         if not layers_data:
             return jsonify({'error': 'Failed to retrieve layers data'}), 503
         
+        cache.set(ISDA_LAYERS_CACHE_KEY, layers_data, timeout=ISDA_LAYERS_CACHE_TIMEOUT)
         return jsonify(layers_data), 200
         
     except Exception as e:
@@ -1,56 +1,78 @@
-from flask import Blueprint, jsonify, request
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask import Blueprint, jsonify, request, Response, stream_with_context
+from flask_jwt_extended import jwt_required
+from sqlalchemy import select, exists, func, distinct, case, or_
 from src.models.user import User, db
 from src.models.farm import Farm
 from src.models.soil_analysis import SoilAnalysis, Recommendation
-from datetime import datetime, timedelta
+from src.utils.auth import current_uid, user_exists
+from src.utils.clock import request_now
+from src.extensions import cache, dashboard_cache_key, invalidate_dashboard, DASHBOARD_CACHE_TIMEOUT
+from datetime import timedelta
 import logging
+import orjson
 
 logger = logging.getLogger(__name__)
 
 utils_bp = Blueprint('utils', __name__)
 
+# Farm columns in Farm.to_dict() order, for read-only queries that skip ORM hydration
+FARM_COLUMNS = (
+    Farm.id, Farm.user_id, Farm.name, Farm.description, Farm.latitude,
+    Farm.longitude, Farm.area, Farm.crop_type, Farm.created_at, Farm.updated_at
+)
+
 @utils_bp.route('/dashboard', methods=['GET'])
 @jwt_required()
 def get_dashboard_data():
     """Get dashboard data for the current user"""
     try:
-        current_user_id = int(get_jwt_identity())
-        user = User.query.get(current_user_id)
+        current_user_id = current_uid()
         
-        if not user:
+        # A deleted user's cached dashboard may outlive them, so confirm the user first
+        if not user_exists(current_user_id):
             return jsonify({'error': 'User not found'}), 404
         
-        # Get user's farms count
-        farms_count = Farm.query.filter_by(user_id=current_user_id).count()
+        # Serve the serialized dashboard while it is fresh; writes invalidate it
+        cached = cache.get(dashboard_cache_key(current_user_id))
+        if cached is not None:
+            return Response(cached, status=200, mimetype='application/json')
+        
+        user = db.session.get(User, current_user_id)
         
-        # Get recent soil analyses
-        recent_analyses = SoilAnalysis.query.join(Farm)\
-            .filter(Farm.user_id == current_user_id)\
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        
+        # Stored health scores of the five most recent analyses; zero scores are left out of the average
+        recent_scores = select(func.nullif(SoilAnalysis.overall_score, 0).label('score'))\
+            .join(Farm, SoilAnalysis.farm_id == Farm.id)\
+            .where(Farm.user_id == current_user_id)\
             .order_by(SoilAnalysis.analyzed_at.desc())\
-            .limit(5).all()
-        
-        # Get high priority recommendations count
-        high_priority_recs = Recommendation.query.join(SoilAnalysis).join(Farm)\
-            .filter(Farm.user_id == current_user_id, Recommendation.priority <= 2)\
-            .count()
-        
-        # Get total soil analyses count
-        total_analyses = SoilAnalysis.query.join(Farm)\
-            .filter(Farm.user_id == current_user_id).count()
-        
-        # Calculate average soil health score for user's farms
-        avg_health_score = None
-        if recent_analyses:
-            from src.services.recommendation_service import recommendation_service
-            scores = []
-            for analysis in recent_analyses:
-                health_data = recommendation_service.get_soil_health_score(analysis.soil_properties)
-                if health_data.get('overall_score'):
-                    scores.append(health_data['overall_score'])
-            
-            if scores:
-                avg_health_score = sum(scores) / len(scores)
+            .limit(5).subquery()
+        
+        # Farm, analysis and high-priority recommendation counts and the average recent
+        # health score in one round-trip
+        farms_count, total_analyses, high_priority_recs, avg_health_score = db.session.execute(
+            select(
+                func.count(distinct(Farm.id)),
+                func.count(distinct(SoilAnalysis.id)),
+                func.count(case((Recommendation.priority <= 2, Recommendation.id))),
+                select(func.avg(recent_scores.c.score)).scalar_subquery()
+            ).select_from(Farm)
+            .outerjoin(SoilAnalysis, SoilAnalysis.farm_id == Farm.id)
+            .outerjoin(Recommendation, Recommendation.soil_analysis_id == SoilAnalysis.id)
+            .where(Farm.user_id == current_user_id)
+        ).one()
+        
+        # Get recent soil analyses as plain rows, with the farm name from the same join
+        recent_analyses = db.session.execute(
+            select(
+                SoilAnalysis.id, SoilAnalysis.farm_id, SoilAnalysis.analyzed_at,
+                SoilAnalysis.depth, Farm.name.label('farm_name')
+            ).join(Farm, SoilAnalysis.farm_id == Farm.id)
+            .where(Farm.user_id == current_user_id)
+            .order_by(SoilAnalysis.analyzed_at.desc())
+            .limit(5)
+        ).all()
         
         dashboard_data = {
             'user': user.to_dict(),
@@ -58,20 +80,23 @@ def get_dashboard_data():
                 'farms_count': farms_count,
                 'total_analyses': total_analyses,
                 'high_priority_recommendations': high_priority_recs,
-                'average_soil_health': round(avg_health_score, 1) if avg_health_score else None
+                'average_soil_health': round(avg_health_score, 1) if avg_health_score is not None else None
             },
             'recent_analyses': [
                 {
                     'id': analysis.id,
                     'farm_id': analysis.farm_id,
-                    'farm_name': analysis.farm.name,
-                    'analyzed_at': analysis.analyzed_at.isoformat(),
+                    'farm_name': analysis.farm_name,
+                    'analyzed_at': analysis.analyzed_at,
                     'depth': analysis.depth
                 } for analysis in recent_analyses
             ]
         }
         
-        return jsonify(dashboard_data), 200
+        payload = orjson.dumps(dashboard_data)
+        cache.set(dashboard_cache_key(current_user_id), payload, timeout=DASHBOARD_CACHE_TIMEOUT)
+        
+        return Response(payload, status=200, mimetype='application/json')
         
     except Exception as e:
         logger.error(f"Error getting dashboard data: {str(e)}")
@@ -82,7 +107,7 @@ def get_dashboard_data():
 def search():
     """Search across farms and analyses for the current user"""
     try:
-        current_user_id = int(get_jwt_identity())
+        current_user_id = current_uid()
         query = request.args.get('q', '').strip()
         
         if not query:
@@ -91,24 +116,18 @@ def search():
         if len(query) < 2:
             return jsonify({'error': 'Search query must be at least 2 characters'}), 400
         
-        # Search farms
-        farms = Farm.query.filter(
-            Farm.user_id == current_user_id,
-            Farm.name.ilike(f'%{query}%')
-        ).limit(10).all()
-        
-        # Search by crop type
-        crop_farms = Farm.query.filter(
-            Farm.user_id == current_user_id,
-            Farm.crop_type.ilike(f'%{query}%')
-        ).limit(10).all()
-        
-        # Combine and deduplicate farms
-        all_farms = {farm.id: farm for farm in farms + crop_farms}
+        # Match name or crop type in one query; the database handles deduplication
+        pattern = f'%{query}%'
+        farms = db.session.execute(
+            select(*FARM_COLUMNS).where(
+                Farm.user_id == current_user_id,
+                or_(Farm.name.ilike(pattern), Farm.crop_type.ilike(pattern))
+            ).limit(10)
+        ).all()
         
         search_results = {
-            'farms': [farm.to_dict() for farm in all_farms.values()],
-            'total_results': len(all_farms),
+            'farms': [farm._asdict() for farm in farms],
+            'total_results': len(farms),
             'query': query
         }
         
@@ -123,16 +142,19 @@ def search():
 def get_profile():
     """Get current user profile"""
     try:
-        current_user_id = int(get_jwt_identity())
-        user = User.query.get(current_user_id)
+        current_user_id = current_uid()
+        user = db.session.get(User, current_user_id)
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
         # Get additional profile stats
-        farms_count = Farm.query.filter_by(user_id=current_user_id).count()
-        analyses_count = SoilAnalysis.query.join(Farm)\
-            .filter(Farm.user_id == current_user_id).count()
+        farms_count, analyses_count = db.session.execute(
+            select(func.count(distinct(Farm.id)), func.count(SoilAnalysis.id))
+            .select_from(Farm)
+            .outerjoin(SoilAnalysis, SoilAnalysis.farm_id == Farm.id)
+            .where(Farm.user_id == current_user_id)
+        ).one()
         
         profile_data = user.to_dict()
         profile_data['stats'] = {
@@ -152,8 +174,8 @@ def get_profile():
 def update_profile():
     """Update current user profile"""
     try:
-        current_user_id = int(get_jwt_identity())
-        user = User.query.get(current_user_id)
+        current_user_id = current_uid()
+        user = db.session.get(User, current_user_id)
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
@@ -172,13 +194,14 @@ def update_profile():
             new_email = data['email'].strip().lower()
             if new_email != user.email:
                 # Check if email already exists
-                existing_user = User.query.filter_by(email=new_email).first()
-                if existing_user:
+                email_taken = db.session.scalar(select(exists().where(User.email == new_email)))
+                if email_taken:
                     return jsonify({'error': 'Email already in use'}), 409
                 user.email = new_email
         
-        user.updated_at = datetime.utcnow()
+        user.updated_at = request_now()
         db.session.commit()
+        invalidate_dashboard(current_user_id)
         
         return jsonify({
             'message': 'Profile updated successfully',
@@ -195,8 +218,8 @@ def update_profile():
 def change_password():
     """Change user password"""
     try:
-        current_user_id = int(get_jwt_identity())
-        user = User.query.get(current_user_id)
+        current_user_id = current_uid()
+        user = db.session.get(User, current_user_id)
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
@@ -218,8 +241,9 @@ def change_password():
         
         # Update password
         user.set_password(new_password)
-        user.updated_at = datetime.utcnow()
+        user.updated_at = request_now()
         db.session.commit()
+        invalidate_dashboard(current_user_id)
         
         return jsonify({'message': 'Password changed successfully'}), 200
         
@@ -229,6 +253,7 @@ def change_password():
         return jsonify({'error': 'Failed to change password', 'details': str(e)}), 500
 
 @utils_bp.route('/app-info', methods=['GET'])
+@cache.cached(timeout=86400)
 def get_app_info():
     """Get application information (public endpoint)"""
     return jsonify({
@@ -251,70 +276,63 @@ def get_app_info():
         }
     }), 200
 
+def _stream_statistics(head, tail, crop_stats):
+    """Yield the statistics document, writing crop_distribution entries as rows arrive"""
+    yield head
+    separator = b''
+    for partition in crop_stats.partitions():
+        for crop, count in partition:
+            yield separator + orjson.dumps({'crop_type': crop, 'count': count})
+            separator = b','
+    yield tail
+
 @utils_bp.route('/statistics', methods=['GET'])
 @jwt_required()
 def get_user_statistics():
     """Get detailed statistics for the current user"""
     try:
-        current_user_id = int(get_jwt_identity())
+        current_user_id = current_uid()
         
         # Get date range from query params (default to last 30 days)
         days = request.args.get('days', 30, type=int)
-        start_date = datetime.utcnow() - timedelta(days=days)
-        
-        # Farms statistics
-        total_farms = Farm.query.filter_by(user_id=current_user_id).count()
-        
-        # Crop type distribution
-        crop_stats = db.session.query(
-            Farm.crop_type, 
-            db.func.count(Farm.id).label('count')
-        ).filter(
-            Farm.user_id == current_user_id,
-            Farm.crop_type.isnot(None),
-            Farm.crop_type != ''
-        ).group_by(Farm.crop_type).all()
-        
-        # Soil analyses statistics
-        total_analyses = SoilAnalysis.query.join(Farm)\
-            .filter(Farm.user_id == current_user_id).count()
-        
-        recent_analyses = SoilAnalysis.query.join(Farm)\
-            .filter(
-                Farm.user_id == current_user_id,
-                SoilAnalysis.analyzed_at >= start_date
-            ).count()
-        
-        # Recommendations statistics
-        total_recommendations = Recommendation.query.join(SoilAnalysis).join(Farm)\
-            .filter(Farm.user_id == current_user_id).count()
-        
-        high_priority_recs = Recommendation.query.join(SoilAnalysis).join(Farm)\
-            .filter(
+        start_date = request_now() - timedelta(days=days)
+        
+        # Farm, analysis and recommendation totals in one aggregate statement
+        (total_farms, total_analyses, recent_analyses,
+         total_recommendations, high_priority_recs) = db.session.execute(
+            select(
+                func.count(distinct(Farm.id)),
+                func.count(distinct(SoilAnalysis.id)),
+                func.count(distinct(case((SoilAnalysis.analyzed_at >= start_date, SoilAnalysis.id)))),
+                func.count(Recommendation.id),
+                func.count(case((Recommendation.priority <= 2, Recommendation.id)))
+            ).select_from(Farm)
+            .outerjoin(SoilAnalysis, SoilAnalysis.farm_id == Farm.id)
+            .outerjoin(Recommendation, Recommendation.soil_analysis_id == SoilAnalysis.id)
+            .where(Farm.user_id == current_user_id)
+        ).one()
+        
+        # Crop type distribution, fetched in batches while the response streams
+        crop_stats = db.session.execute(
+            select(Farm.crop_type, func.count(Farm.id).label('count'))
+            .where(
                 Farm.user_id == current_user_id,
-                Recommendation.priority <= 2
-            ).count()
-        
-        statistics = {
-            'period_days': days,
-            'farms': {
-                'total': total_farms,
-                'crop_distribution': [
-                    {'crop_type': crop, 'count': count} 
-                    for crop, count in crop_stats
-                ]
-            },
-            'analyses': {
-                'total': total_analyses,
-                'recent': recent_analyses
-            },
-            'recommendations': {
-                'total': total_recommendations,
-                'high_priority': high_priority_recs
-            }
-        }
-        
-        return jsonify({'statistics': statistics}), 200
+                Farm.crop_type.isnot(None),
+                Farm.crop_type != ''
+            ).group_by(Farm.crop_type)
+            .execution_options(yield_per=500)
+        )
+        
+        head = b'{"statistics":{"period_days":%d,"farms":{"total":%d,"crop_distribution":[' % (days, total_farms)
+        tail = b']},"analyses":%b,"recommendations":%b}}' % (
+            orjson.dumps({'total': total_analyses, 'recent': recent_analyses}),
+            orjson.dumps({'total': total_recommendations, 'high_priority': high_priority_recs})
+        )
+        
+        return Response(
+            stream_with_context(_stream_statistics(head, tail, crop_stats)),
+            status=200, mimetype='application/json'
+        )
         
     except Exception as e:
         logger.error(f"Error getting statistics: {str(e)}")
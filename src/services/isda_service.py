@@ -1,11 +1,20 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import logging
 from typing import Dict, List, Optional, Tuple, Any
-from datetime import datetime, timedelta
+from datetime import timedelta
 import json
+from src.extensions import cache
+from src.utils.clock import utcnow
 
 logger = logging.getLogger(__name__)
 
+# iSDA soil data is served at ~30m resolution and changes rarely, so results are
+# cached for a day per coordinate rounded to 4 decimal places (~10m)
+SOIL_PROPERTIES_CACHE_TIMEOUT = 86400
+COORDINATE_PRECISION = 4
+
 class ISDAService:
     """
     Service for interacting with the iSDAsoil API.
@@ -17,18 +26,31 @@ class ISDAService:
         self.access_token = None
         self.token_expires_at = None
         
+        # One pooled keep-alive session so repeated calls reuse the TLS connection;
+        # idempotent requests are retried on transient gateway errors
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=16,
+            max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504])
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        
     def authenticate(self, username: str, password: str) -> bool:
         """Authenticate with iSDA API and get an access token."""
         try:
             payload = {"username": username, "password": password}
-            response = requests.post(f"{self.base_url}/login", data=payload, timeout=30)
+            response = self.session.post(f"{self.base_url}/login", data=payload, timeout=30)
             
             response.raise_for_status()  # Raise an exception for bad status codes (4xx or 5xx)
             
             data = response.json()
             self.access_token = data.get("access_token")
             # Token expires in 60 minutes, refresh a bit earlier
-            self.token_expires_at = datetime.utcnow() + timedelta(minutes=55)
+            self.token_expires_at = utcnow() + timedelta(minutes=55)
+            # Attach the token to the session once rather than building headers per call
+            self.session.headers["Authorization"] = f"Bearer {self.access_token}"
             logger.info("Successfully authenticated with iSDA API")
             return True
                 
@@ -41,26 +63,21 @@ class ISDAService:
         return (
             self.access_token is not None and 
             self.token_expires_at is not None and 
-            datetime.utcnow() < self.token_expires_at
+            utcnow() < self.token_expires_at
         )
     
-    def _get_headers(self) -> Dict[str, str]:
-        """Get headers with the authorization token."""
+    def _require_token(self) -> None:
+        """Ensure a valid token is attached to the session."""
         if not self._is_token_valid():
             # This should ideally be handled by re-authenticating.
             # For simplicity, we raise an error to be caught by the calling function.
             raise ConnectionError("No valid access token. Please authenticate first.")
-        
-        return {
-            "Authorization": f"Bearer {self.access_token}",
-            "Content-Type": "application/json"
-        }
     
     def get_available_layers(self) -> Optional[Dict]:
         """Get metadata about available soil property layers."""
         try:
-            headers = self._get_headers()
-            response = requests.get(f"{self.base_url}/isdasoil/v2/layers", headers=headers, timeout=30)
+            self._require_token()
+            response = self.session.get(f"{self.base_url}/isdasoil/v2/layers", timeout=30)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
@@ -85,19 +102,27 @@ class ISDAService:
             if not (-180 <= longitude <= 180):
                 raise ValueError("Longitude must be between -180 and 180")
             
-            headers = self._get_headers()
+            latitude = round(latitude, COORDINATE_PRECISION)
+            longitude = round(longitude, COORDINATE_PRECISION)
+            cache_key = f"isda:soilproperty:{latitude}:{longitude}:{depth}"
+            cached = cache.get(cache_key)
+            if cached is not None:
+                return cached
+            
+            self._require_token()
             params = {"lat": latitude, "lon": longitude, "depth": depth}
             
             # By not specifying a 'property' or 'depth', the API returns all available data.
-            response = requests.get(
+            response = self.session.get(
                 f"{self.base_url}/isdasoil/v2/soilproperty",
-                headers=headers,
                 params=params,
                 timeout=45  # Increased timeout for potentially larger response
             )
             
             response.raise_for_status()
-            return response.json()
+            soil_data = response.json()
+            cache.set(cache_key, soil_data, timeout=SOIL_PROPERTIES_CACHE_TIMEOUT)
+            return soil_data
                 
         except (ValueError, requests.exceptions.RequestException) as e:
             logger.error(f"Error getting all soil properties: {e}")
@@ -142,5 +167,40 @@ class ISDAService:
             # Handles case where property_data is None
             return None
 
+    @staticmethod
+    def index_by_depth(
+        soil_properties: Dict[str, Any],
+        property_names: Optional[Tuple[str, ...]] = None
+    ) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """
+        Index a 'property' mapping (as stored on SoilAnalysis) by property and depth in one pass.
+
+        Args:
+            soil_properties: The 'property' mapping from an iSDA response.
+            property_names: Only index these properties (default: all of them).
+
+        Returns:
+            {property_name: {depth: layer}}, so repeated lookups are dict hits instead of
+            a scan of each property's layer list. Malformed data yields no layers.
+        """
+        index = {}
+        if not isinstance(soil_properties, dict):
+            return index
+        for property_name in soil_properties if property_names is None else property_names:
+            layers = soil_properties.get(property_name)
+            by_depth = {}
+            for layer in layers if isinstance(layers, list) else ():
+                depth_info = layer.get("depth", {}) if isinstance(layer, dict) else None
+                # A malformed layer ends the scan: depths listed after it read as missing,
+                # just as a per-depth scan gives up when it reaches the bad layer
+                if not isinstance(depth_info, dict):
+                    break
+                depth = depth_info.get("value")
+                # Keep the first layer per depth, as extract_property_data does
+                if isinstance(depth, str) and depth not in by_depth:
+                    by_depth[depth] = layer
+            index[property_name] = by_depth
+        return index
+
 # Global instance for the service
-isda_service = ISDAService()
\ No newline at end of file
+isda_service = ISDAService()
@@ -1,9 +1,87 @@
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 import logging
-from datetime import datetime
+from dataclasses import dataclass
+import operator
+from functools import lru_cache
+from bisect import bisect_right
+from src.services.isda_service import ISDAService
 
 logger = logging.getLogger(__name__)
 
+
+# Health categories by overall score: a cut is the lowest score of the next category up
+_CUTS = (40, 60, 80)
+_CATS = ("Poor", "Fair", "Good", "Excellent")
+
+# Shared result for readings that trigger no rule
+_EMPTY = ()
+
+# USDA texture classes mapped to the texture rule they trigger. Any class naming
+# Clay is managed as clay before Sandy is considered, so "Sandy Clay" is clay and
+# "Loamy Sand" (no "Sandy") triggers neither rule.
+_TEXTURE_KIND = {
+    "Clay": "clay", "Silty Clay": "clay", "Sandy Clay": "clay",
+    "Clay Loam": "clay", "Silty Clay Loam": "clay", "Sandy Clay Loam": "clay",
+    "Sandy Loam": "sandy",
+    "Loamy Sand": "other", "Sand": "other", "Loam": "other", "Silt Loam": "other", "Silt": "other",
+}
+
+
+def _texture_is(value: Any, kind: str) -> bool:
+    """Rule comparison for texture: known classes are a dict hit, anything else falls back to substrings."""
+    found = _TEXTURE_KIND.get(value) if isinstance(value, str) else None
+    if found is None:
+        found = "clay" if "Clay" in value else "sandy" if "Sandy" in value else "other"
+    return found == kind
+
+
+# Recommendation descriptions, as %-format strings filled with the (converted) reading
+_DESC = {
+    "ph_low": "Soil pH is %.1f, which is very acidic. Apply agricultural lime to raise the pH. This improves nutrient availability and reduces potential aluminum toxicity.",
+    "ph_high": "Soil pH is %.1f, which is alkaline. Apply elemental sulfur or use acidifying fertilizers (like ammonium sulfate) to lower the pH.",
+    "carbon_low": "Organic Carbon is low at %.2f%%. Incorporate compost, manure, cover crops, or crop residues to improve soil structure, water retention, and fertility.",
+    "nitrogen_low": "Total Nitrogen is very low at %.2f%%. Apply a nitrogen-based fertilizer. Consider split applications to match crop needs and reduce loss.",
+    "phosphorus_low": "Extractable Phosphorus is low at %.1f ppm. Apply a phosphorus fertilizer (e.g., MAP, DAP) at planting to support root development.",
+    "potassium_low": "Extractable Potassium is low at %.1f ppm. Apply a potassium fertilizer (e.g., MOP, SOP) to improve plant vigor and stress resistance.",
+    "cec_low": "Cation Exchange Capacity (CEC) is low at %.1f cmol(+)/kg. This indicates a sandy or low-organic matter soil that struggles to retain nutrients. Frequent, small applications of fertilizer are more effective than single large ones. Building organic matter is key.",
+    "sulphur_low": "Sulphur level is low at %.1f ppm. Consider using sulphur-containing fertilizers like ammonium sulphate or gypsum.",
+    "zinc_low": "Zinc level is low at %.1f ppm. A foliar spray or soil application of a zinc supplement may be needed, especially for sensitive crops like maize.",
+    "texture_clay": "Soil texture is '%s'. Clay soils have excellent water and nutrient retention but can be prone to compaction and poor drainage. Avoid working the soil when wet and incorporate organic matter to improve structure.",
+    "texture_sandy": "Soil texture is '%s'. Sandy soils have excellent drainage but poor water and nutrient retention. Frequent irrigation and split fertilizer applications are recommended. Building organic matter is critical.",
+}
+
+
+@dataclass(frozen=True, slots=True)
+class SoilRecommendation:
+    """A single rule-table recommendation; immutable so memoized results can be shared."""
+    type: str
+    title: str
+    description: str
+    priority: int
+
+    def to_dict(self) -> Dict:
+        """Convert to the dict shape used by the API and the Recommendation model."""
+        return {
+            "type": self.type,
+            "title": self.title,
+            "description": self.description,
+            "priority": self.priority
+        }
+
+
+def _layer_value(layer: Dict, key: str) -> Any:
+    """Read layer["value"][key], or None when the layer's value block is missing or malformed."""
+    value = layer.get("value", {})
+    return value.get(key) if isinstance(value, dict) else None
+
+
+def _score_kernel(value: float, min_val: float, max_val: float) -> float:
+    """Score a value from 0 to 100 against an optimal range; a free function so the scoring loop skips method dispatch."""
+    # Branchless form of the piecewise ramp: 100 inside [min_val, max_val], falling linearly
+    # to 0 at 0 below the range and at 2*max_val above it. NaN still scores 0.
+    return 100 * max(0, min(value / min_val, 1 - (value - max_val) / max_val, 1))
+
+
 class RecommendationService:
     """
     Service for generating farming recommendations and health scores
@@ -23,17 +101,96 @@ class RecommendationService:
             "sulphur_extractable": {"min": 10, "max": 20, "unit": "ppm"},
             "zinc_extractable": {"min": 1.5, "max": 5.0, "unit": "ppm"},
         }
+        
+        # Recommendation rules, in output order before the priority sort. Each property has
+        # (comparison, threshold, divisor, type, title, priority, description) rules; the first
+        # match wins, and only its description (from _DESC) is formatted. The divisor converts API units first
+        # (g/kg -> % for carbon and nitrogen); None leaves the value as reported.
+        self._rules = (
+            ("ph", (
+                (operator.lt, 5.5, None, "amendment", "Correct Low pH", 1, _DESC["ph_low"]),
+                (operator.gt, 7.8, None, "amendment", "Correct High pH", 1, _DESC["ph_high"]),
+            )),
+            ("carbon_organic", (
+                (operator.lt, 1.0, 10, "management", "Increase Organic Matter", 2, _DESC["carbon_low"]),
+            )),
+            ("nitrogen_total", (
+                (operator.lt, 0.1, 10, "fertilizer", "Apply Nitrogen (N)", 1, _DESC["nitrogen_low"]),
+            )),
+            ("phosphorous_extractable", (
+                (operator.lt, 20, None, "fertilizer", "Apply Phosphorus (P)", 2, _DESC["phosphorus_low"]),
+            )),
+            ("potassium_extractable", (
+                (operator.lt, 120, None, "fertilizer", "Apply Potassium (K)", 2, _DESC["potassium_low"]),
+            )),
+            ("cation_exchange_capacity", (
+                (operator.lt, 8, None, "insight", "Low Nutrient Holding Capacity", 3, _DESC["cec_low"]),
+            )),
+            ("sulphur_extractable", (
+                (operator.lt, 8, None, "fertilizer", "Apply Sulphur (S)", 3, _DESC["sulphur_low"]),
+            )),
+            ("zinc_extractable", (
+                (operator.lt, 1.0, None, "micronutrient", "Apply Zinc (Zn)", 4, _DESC["zinc_low"]),
+            )),
+            ("texture_class", (
+                (_texture_is, "clay", None, "management", "Manage Clay Texture", 5, _DESC["texture_clay"]),
+                (_texture_is, "sandy", None, "management", "Manage Sandy Texture", 5, _DESC["texture_sandy"]),
+            )),
+        )
+        
+        # Parallel per-property tuples (structure of arrays) so the scoring loop walks flat
+        # sequences instead of re-reading the nested optimal_ranges dicts
+        self._score_props = tuple(self.optimal_ranges)
+        self._score_bounds = tuple((r["min"], r["max"]) for r in self.optimal_ranges.values())
+        # Divisor applied to g/kg readings of properties scored in % (None: no conversion)
+        self._score_divisor = tuple(10 if r["unit"] == "%" else None for r in self.optimal_ranges.values())
+        
+        # Readings that fully determine the output for one depth: the value of every rule
+        # property (a superset of the scored ones), aligned with _rules
+        self._reading_props = tuple(prop for prop, _ in self._rules)
+        self._score_slots = tuple(self._reading_props.index(prop) for prop in self._score_props)
+        
+        # Repeat analyses of the same parcel produce identical readings, so results are
+        # memoized on them. Cached results are shared and only ever handed out as copies.
+        self._recommend_cached = lru_cache(maxsize=1024)(self._recommend)
+        self._health_cached = lru_cache(maxsize=1024)(self._health_score)
+
+    def _index_properties(self, soil_properties: Dict) -> Dict[str, Dict[str, Any]]:
+        """Map each rule property to {depth: value} in one walk; malformed layers read as missing."""
+        return {
+            prop: {depth: _layer_value(layer, "value") for depth, layer in layers.items()}
+            for prop, layers in ISDAService.index_by_depth(soil_properties, self._reading_props).items()
+        }
+
+    def _readings(self, soil_properties: Dict, depth: str) -> Tuple[tuple, tuple]:
+        """Fingerprint the inputs for a depth: rule-property values plus the units that drive conversion."""
+        index = self._index_properties(soil_properties)
+        values = tuple(index.get(prop, {}).get(depth) for prop in self._reading_props)
+        units = tuple(
+            _layer_value(soil_properties[prop][0], "unit")
+            if divisor and values[slot] is not None else None
+            for prop, divisor, slot in zip(self._score_props, self._score_divisor, self._score_slots)
+        )
+        return values, units
 
-    def _get_value_from_properties(self, properties: Dict, prop_name: str, depth: str) -> Optional[Any]:
-        """Helper to safely extract a single value for a given property and depth."""
+    @staticmethod
+    def _memoized(cached, uncached, *readings):
+        """Call the memoized variant unless the readings are unhashable (malformed payloads)."""
         try:
-            property_layers = properties.get(prop_name, [])
-            for layer in property_layers:
-                if layer.get("depth", {}).get("value") == depth:
-                    return layer.get("value", {}).get("value")
-            return None
-        except (AttributeError, TypeError):
-            return None
+            hash(readings)
+        except TypeError:
+            return uncached(*readings)
+        return cached(*readings)
+
+    def analyze(
+        self,
+        soil_properties: Dict,
+        crop_type: Optional[str] = None,
+        depth: str = "0-20"
+    ) -> Tuple[List[Dict], Dict]:
+        """Return (recommendations, health score) for a depth, indexing the properties only once."""
+        values, units = self._readings(soil_properties, depth)
+        return self._recommendation_dicts(values), self._copy_health(values, units, depth)
 
     def generate_recommendations(
         self, 
@@ -44,130 +201,65 @@ class RecommendationService:
         """
         Generate recommendations for a specific soil depth based on the full analysis.
         """
+        values, _ = self._readings(soil_properties, depth)
+        return self._recommendation_dicts(values)
+
+    def _recommendation_dicts(self, values: tuple) -> List[Dict]:
+        """Serialize the recommendations for the readings; callers are free to mutate the dicts."""
+        return [rec.to_dict() for rec in self._memoized(self._recommend_cached, self._recommend, values)]
+
+    def _recommend(self, values: tuple) -> Tuple["SoilRecommendation", ...]:
+        """Run the rule table against the values aligned with _reading_props."""
         recommendations = []
         
-        # A map of property names to their analysis functions
-        analysis_functions = {
-            "ph": self._analyze_ph,
-            "carbon_organic": self._analyze_organic_carbon,
-            "nitrogen_total": self._analyze_nitrogen,
-            "phosphorous_extractable": self._analyze_phosphorus,
-            "potassium_extractable": self._analyze_potassium,
-            "cation_exchange_capacity": self._analyze_cec,
-            "sulphur_extractable": self._analyze_sulphur,
-            "zinc_extractable": self._analyze_zinc,
-            "texture_class": self._analyze_texture,
-        }
-
-        for prop_name, func in analysis_functions.items():
-            value = self._get_value_from_properties(soil_properties, prop_name, depth)
-            if value is not None:
-                rec = func(value)
-                if rec:
-                    recommendations.extend(rec)
+        for (prop_name, rules), value in zip(self._rules, values):
+            if value is None:
+                continue
+            for compare, threshold, divisor, rec_type, title, priority, description in rules:
+                subject = value / divisor if divisor else value
+                if compare(subject, threshold):
+                    recommendations.append(SoilRecommendation(rec_type, title, description % subject, priority))
+                    break
             
-        recommendations.sort(key=lambda x: x.get("priority", 5))
-        return recommendations
+        if not recommendations:
+            return _EMPTY
+        recommendations.sort(key=operator.attrgetter("priority"))
+        return tuple(recommendations)
 
     def get_soil_health_score(self, soil_properties: Dict, depth: str = "0-20") -> Dict:
         """Calculate overall soil health score based on key properties at a specific depth."""
-        scores = {}
-        total_score = 0
-        property_count = 0
-        
-        for prop, optimal in self.optimal_ranges.items():
-            value = self._get_value_from_properties(soil_properties, prop, depth)
-            if value is not None:
-                # CRITICAL: Handle unit conversions before scoring
-                original_unit = soil_properties.get(prop, [{}])[0].get("value", {}).get("unit")
-                if original_unit == "g/kg" and optimal["unit"] == "%":
-                    value /= 10
-                
-                score = self._calculate_property_score(value, optimal["min"], optimal["max"])
-                scores[prop] = round(score)
-                total_score += score
-                property_count += 1
-        
-        overall_score = total_score / property_count if property_count > 0 else 0
+        values, units = self._readings(soil_properties, depth)
+        return self._copy_health(values, units, depth)
+
+    def _copy_health(self, values: tuple, units: tuple, depth: str) -> Dict:
+        """A fresh health score dict for the readings, stamped with the depth."""
+        health = self._memoized(self._health_cached, self._health_score, values, units)
+        return {**health, "property_scores": dict(health["property_scores"]), "analysis_depth": depth}
+
+    def _health_score(self, values: tuple, units: tuple) -> Dict:
+        """Score the readings; units holds the first-layer unit of each converted property."""
+        scored = []
+        for prop, (lo, hi), divisor, slot, unit in zip(
+            self._score_props, self._score_bounds, self._score_divisor, self._score_slots, units
+        ):
+            value = values[slot]
+            if value is None:
+                continue
+            # CRITICAL: Handle unit conversions before scoring
+            if divisor and unit == "g/kg":
+                value /= divisor
+            scored.append((prop, _score_kernel(value, lo, hi)))
         
-        if overall_score >= 80: health_category = "Excellent"
-        elif overall_score >= 60: health_category = "Good"
-        elif overall_score >= 40: health_category = "Fair"
-        else: health_category = "Poor"
+        scores = {prop: round(score) for prop, score in scored}
+        # sum() adds left to right like the old running total, so averages are unchanged
+        overall_score = sum(score for _, score in scored) / len(scored) if scored else 0
         
         return {
             "overall_score": round(overall_score),
-            "health_category": health_category,
-            "property_scores": scores,
-            "analysis_depth": depth
+            "health_category": _CATS[bisect_right(_CUTS, overall_score)],
+            "property_scores": scores
         }
 
-    def _calculate_property_score(self, value: float, min_val: float, max_val: float) -> float:
-        """Generic function to calculate a score from 0 to 100 based on an optimal range."""
-        if min_val <= value <= max_val:
-            return 100
-        elif value < min_val:
-            # Score decreases from 100 to 0 as value moves from min_val to 0.
-            return max(0, 100 * (value / min_val))
-        else: # value > max_val
-            # Score decreases from 100 to 0 as value moves from max_val to 2*max_val.
-            return max(0, 100 * (1 - (value - max_val) / max_val))
-            
-    # --- Individual Property Analysis Methods ---
-
-    def _analyze_ph(self, value: float) -> List[Dict]:
-        if value < 5.5:
-            return [{"type": "amendment", "title": "Correct Low pH", "description": f"Soil pH is {value:.1f}, which is very acidic. Apply agricultural lime to raise the pH. This improves nutrient availability and reduces potential aluminum toxicity.", "priority": 1}]
-        if value > 7.8:
-            return [{"type": "amendment", "title": "Correct High pH", "description": f"Soil pH is {value:.1f}, which is alkaline. Apply elemental sulfur or use acidifying fertilizers (like ammonium sulfate) to lower the pH.", "priority": 1}]
-        return []
-
-    def _analyze_organic_carbon(self, value: float) -> List[Dict]:
-        # The value from API is in g/kg. Convert to % by dividing by 10.
-        value_percent = value / 10
-        if value_percent < 1.0:
-            return [{"type": "management", "title": "Increase Organic Matter", "description": f"Organic Carbon is low at {value_percent:.2f}%. Incorporate compost, manure, cover crops, or crop residues to improve soil structure, water retention, and fertility.", "priority": 2}]
-        return []
-
-    def _analyze_nitrogen(self, value: float) -> List[Dict]:
-        # The value from API is in g/kg. Convert to % by dividing by 10.
-        value_percent = value / 10
-        if value_percent < 0.1:
-            return [{"type": "fertilizer", "title": "Apply Nitrogen (N)", "description": f"Total Nitrogen is very low at {value_percent:.2f}%. Apply a nitrogen-based fertilizer. Consider split applications to match crop needs and reduce loss.", "priority": 1}]
-        return []
-
-    def _analyze_phosphorus(self, value: float) -> List[Dict]:
-        if value < 20:
-            return [{"type": "fertilizer", "title": "Apply Phosphorus (P)", "description": f"Extractable Phosphorus is low at {value:.1f} ppm. Apply a phosphorus fertilizer (e.g., MAP, DAP) at planting to support root development.", "priority": 2}]
-        return []
-
-    def _analyze_potassium(self, value: float) -> List[Dict]:
-        if value < 120:
-            return [{"type": "fertilizer", "title": "Apply Potassium (K)", "description": f"Extractable Potassium is low at {value:.1f} ppm. Apply a potassium fertilizer (e.g., MOP, SOP) to improve plant vigor and stress resistance.", "priority": 2}]
-        return []
-    
-    def _analyze_cec(self, value: float) -> List[Dict]:
-        if value < 8:
-            return [{"type": "insight", "title": "Low Nutrient Holding Capacity", "description": f"Cation Exchange Capacity (CEC) is low at {value:.1f} cmol(+)/kg. This indicates a sandy or low-organic matter soil that struggles to retain nutrients. Frequent, small applications of fertilizer are more effective than single large ones. Building organic matter is key.", "priority": 3}]
-        return []
-
-    def _analyze_sulphur(self, value: float) -> List[Dict]:
-        if value < 8:
-            return [{"type": "fertilizer", "title": "Apply Sulphur (S)", "description": f"Sulphur level is low at {value:.1f} ppm. Consider using sulphur-containing fertilizers like ammonium sulphate or gypsum.", "priority": 3}]
-        return []
-
-    def _analyze_zinc(self, value: float) -> List[Dict]:
-        if value < 1.0:
-            return [{"type": "micronutrient", "title": "Apply Zinc (Zn)", "description": f"Zinc level is low at {value:.1f} ppm. A foliar spray or soil application of a zinc supplement may be needed, especially for sensitive crops like maize.", "priority": 4}]
-        return []
-        
-    def _analyze_texture(self, value: str) -> List[Dict]:
-        if "Clay" in value:
-            return [{"type": "management", "title": "Manage Clay Texture", "description": f"Soil texture is '{value}'. Clay soils have excellent water and nutrient retention but can be prone to compaction and poor drainage. Avoid working the soil when wet and incorporate organic matter to improve structure.", "priority": 5}]
-        if "Sandy" in value:
-            return [{"type": "management", "title": "Manage Sandy Texture", "description": f"Soil texture is '{value}'. Sandy soils have excellent drainage but poor water and nutrient retention. Frequent irrigation and split fertilizer applications are recommended. Building organic matter is critical.", "priority": 5}]
-        return []
-
 
 # Global instance for the service
 recommendation_service = RecommendationService()
\ No newline at end of file
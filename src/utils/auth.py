@@ -0,0 +1,40 @@
+from flask import g
+from flask_jwt_extended import get_jwt_identity
+from src.models.user import User, db
+from src.extensions import cache
+
+# Ids of users confirmed to exist are kept in the shared cache, so with a shared backend
+# (CACHE_TYPE=RedisCache) forget_user() reaches every worker. The default SimpleCache is
+# per process: a user deleted through one worker stays known to the others for up to
+# KNOWN_USER_CACHE_TIMEOUT. Only positive results are cached, so a reused id is never
+# wrongly reported missing.
+KNOWN_USER_CACHE_TIMEOUT = 3600
+
+
+def _known_user_key(uid):
+    """Key marking a user id as confirmed to exist"""
+    return f'user-exists:{uid}'
+
+
+def current_uid() -> int:
+    """Return the current user's id from the JWT, converted once per request and cached on g"""
+    uid = getattr(g, '_uid', None)
+    if uid is None:
+        uid = int(get_jwt_identity())
+        g._uid = uid
+    return uid
+
+
+def user_exists(uid: int) -> bool:
+    """Check that a user row exists, skipping the query for ids the cache has already confirmed"""
+    if cache.get(_known_user_key(uid)):
+        return True
+    exists = db.session.query(User.id).filter_by(id=uid).first() is not None
+    if exists:
+        cache.set(_known_user_key(uid), True, timeout=KNOWN_USER_CACHE_TIMEOUT)
+    return exists
+
+
+def forget_user(uid: int) -> None:
+    """Drop a deleted user from the existence cache"""
+    cache.delete(_known_user_key(uid))
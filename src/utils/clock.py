@@ -0,0 +1,16 @@
+from datetime import datetime, timezone
+from flask import g
+
+
+def utcnow() -> datetime:
+    """Naive UTC now, matching how timestamps are stored (datetime.utcnow() is deprecated)"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def request_now() -> datetime:
+    """Return one timestamp for the whole request, taken on first use and cached on g"""
+    now = getattr(g, '_now', None)
+    if now is None:
+        now = utcnow()
+        g._now = now
+    return now
@@ -0,0 +1,10 @@
+from src.services.recommendation_service import recommendation_service
+
+
+def ensure_health_score(analysis):
+    """Return an analysis' stored health score, scoring rows saved before scores were persisted at their own depth"""
+    if analysis.health_score is None:
+        analysis.health_score = recommendation_service.get_soil_health_score(analysis.soil_properties, depth=analysis.depth)
+    if analysis.overall_score is None:
+        analysis.overall_score = analysis.health_score['overall_score']
+    return analysis.health_score
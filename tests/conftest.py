@@ -0,0 +1,86 @@
+import copy
+import os
+import sys
+import tempfile
+from unittest import mock
+
+import pytest
+
+# config.py reads DATABASE_URL at import time, so point it at a throwaway database first
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'test.db')
+os.environ.setdefault('FLASK_CONFIG', 'development')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.main import app as flask_app  # noqa: E402
+from src.models.user import db  # noqa: E402
+from src.extensions import cache  # noqa: E402
+from src.services.isda_service import isda_service  # noqa: E402
+import src.routes.soil_analysis as soil_routes  # noqa: E402
+
+
+def layer(value, unit=None, depth='0-20'):
+    """One iSDA property layer as returned by the soil property endpoint"""
+    return {'depth': {'value': depth, 'unit': 'cm'}, 'value': {'value': value, 'unit': unit}}
+
+
+def soil_properties(depth='0-20'):
+    """A topsoil sample with every scored property below its optimal range"""
+    return {
+        'ph': [layer(5.0, depth=depth)],
+        'carbon_organic': [layer(8.0, 'g/kg', depth)],
+        'nitrogen_total': [layer(0.5, 'g/kg', depth)],
+        'phosphorous_extractable': [layer(10.0, 'ppm', depth)],
+        'potassium_extractable': [layer(100.0, 'ppm', depth)],
+        'cation_exchange_capacity': [layer(5.0, 'cmol(+)/kg', depth)],
+        'sulphur_extractable': [layer(5.0, 'ppm', depth)],
+        'zinc_extractable': [layer(0.5, 'ppm', depth)],
+        'texture_class': [layer('Sandy Loam', depth=depth)],
+    }
+
+
+def register(client, username='farmer'):
+    """Register a user and return the Authorization header for their access token"""
+    resp = client.post('/api/auth/register', json={
+        'username': username, 'email': f'{username}@example.com',
+        'password': 'secret1', 'full_name': username.title()
+    })
+    assert resp.status_code == 201, resp.get_data(as_text=True)
+    return {'Authorization': 'Bearer ' + resp.get_json()['access_token']}
+
+
+@pytest.fixture
+def app():
+    with flask_app.app_context():
+        db.drop_all()
+        db.create_all()
+    cache.clear()
+    yield flask_app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def headers(client):
+    return register(client)
+
+
+@pytest.fixture
+def isda():
+    """Serve soil_properties() (or whatever the test assigns to .properties) instead of calling iSDA"""
+    fake = mock.Mock(properties=soil_properties())
+    fake.fetch.side_effect = lambda *args, **kwargs: {'property': copy.deepcopy(fake.properties)}
+    with mock.patch.object(isda_service, 'get_all_soil_properties', fake.fetch), \
+         mock.patch.object(soil_routes, '_authenticate_isda', return_value=True):
+        yield fake
+
+
+@pytest.fixture
+def farm_id(client, headers):
+    resp = client.post('/api/farms', json={
+        'name': 'North Field', 'latitude': -1.28, 'longitude': 36.82, 'area': 2.5, 'crop_type': 'maize'
+    }, headers=headers)
+    assert resp.status_code == 201, resp.get_data(as_text=True)
+    return resp.get_json()['farm']['id']
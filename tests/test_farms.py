@@ -0,0 +1,35 @@
+from conftest import register
+from src.utils.auth import user_exists
+
+
+def farm_names(client, headers):
+    return sorted(farm['name'] for farm in client.get('/api/farms', headers=headers).get_json()['farms'])
+
+
+def test_cached_farm_list_follows_writes(client, headers, farm_id):
+    assert farm_names(client, headers) == ['North Field']
+
+    client.post('/api/farms', json={'name': 'South Field', 'latitude': 1.0, 'longitude': 36.0}, headers=headers)
+    assert farm_names(client, headers) == ['North Field', 'South Field']
+
+    client.put(f'/api/farms/{farm_id}', json={'name': 'East Field'}, headers=headers)
+    assert farm_names(client, headers) == ['East Field', 'South Field']
+
+    client.delete(f'/api/farms/{farm_id}', headers=headers)
+    assert farm_names(client, headers) == ['South Field']
+
+
+def test_farm_list_is_cached_per_user(client, headers, farm_id):
+    other = register(client, 'neighbour')
+    assert farm_names(client, headers) == ['North Field']
+    assert farm_names(client, other) == []
+
+
+def test_deleted_user_cannot_create_farms(app, client, headers):
+    user_id = client.get('/api/auth/me', headers=headers).get_json()['user']['id']
+    with app.app_context():
+        assert user_exists(user_id)
+    assert client.delete(f'/api/users/{user_id}').status_code == 204
+
+    resp = client.post('/api/farms', json={'name': 'Orphan', 'latitude': 1.0, 'longitude': 36.0}, headers=headers)
+    assert resp.status_code == 404
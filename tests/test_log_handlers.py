@@ -0,0 +1,54 @@
+import logging
+import os
+
+from src.middleware.log_handlers import BufferedRotatingFileHandler
+
+
+def make_handler(path, **kwargs):
+    handler = BufferedRotatingFileHandler(str(path), encoding='utf-8', **kwargs)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    return handler
+
+
+def record(message):
+    return logging.LogRecord('agrisense', logging.INFO, __file__, 1, message, None, None)
+
+
+def test_tracked_size_matches_the_file_in_bytes(tmp_path):
+    path = tmp_path / 'app.log'
+    handler = make_handler(path, maxBytes=1024 * 1024)
+    try:
+        for message in ('plain', 'pH très acide', '土壤'):
+            handler.emit(record(message))
+        handler.flush()
+        assert handler._bytes_written == os.path.getsize(path)
+    finally:
+        handler.close()
+
+
+def test_rolls_over_before_max_bytes_of_multibyte_text(tmp_path):
+    path = tmp_path / 'app.log'
+    handler = make_handler(path, maxBytes=100, backupCount=2)
+    try:
+        # 30 two-byte characters plus the newline: 61 bytes but only 31 characters per record
+        for _ in range(3):
+            handler.emit(record('é' * 30))
+        handler.flush()
+    finally:
+        handler.close()
+    assert os.path.getsize(path) == 61
+    assert os.path.getsize(f'{path}.1') == 61
+    assert os.path.getsize(f'{path}.2') == 61
+
+
+def test_size_is_picked_up_from_an_existing_file(tmp_path):
+    path = tmp_path / 'app.log'
+    path.write_bytes(b'x' * 50)
+    handler = make_handler(path, maxBytes=100, backupCount=1)
+    try:
+        handler.emit(record('é' * 30))
+        handler.flush()
+    finally:
+        handler.close()
+    assert os.path.getsize(f'{path}.1') == 50
+    assert os.path.getsize(path) == 61
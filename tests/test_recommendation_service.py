@@ -0,0 +1,67 @@
+import json
+import math
+import os
+import random
+
+import pytest
+
+from src.services.recommendation_service import recommendation_service, _score_kernel
+
+# Inputs and outputs recorded from the original per-property implementation, including
+# malformed layers; the service must keep producing exactly the same results
+with open(os.path.join(os.path.dirname(__file__), 'data', 'recommendation_cases.json')) as f:
+    CASES = json.load(f)
+
+
+def run(method, case):
+    try:
+        return method(json.loads(json.dumps(case['soil_properties'])), depth=case['depth'])
+    except Exception as e:
+        return {'raises': type(e).__name__}
+
+
+@pytest.mark.parametrize('case', CASES)
+def test_recommendations_match_recorded_results(case):
+    recommendations = run(recommendation_service.generate_recommendations, case)
+    if isinstance(recommendations, list):
+        recommendations = [dict(rec) for rec in recommendations]
+    assert recommendations == case['recommendations']
+
+
+@pytest.mark.parametrize('case', CASES)
+def test_health_scores_match_recorded_results(case):
+    assert run(recommendation_service.get_soil_health_score, case) == case['health_score']
+
+
+def piecewise_score(value, min_val, max_val):
+    """The original three-branch property score"""
+    if min_val <= value <= max_val:
+        return 100
+    elif value < min_val:
+        return max(0, 100 * (value / min_val))
+    else:
+        return max(0, 100 * (1 - (value - max_val) / max_val))
+
+
+@pytest.mark.parametrize('prop', sorted(recommendation_service.optimal_ranges))
+def test_score_kernel_matches_the_piecewise_score(prop):
+    min_val, max_val = recommendation_service.optimal_ranges[prop]['min'], recommendation_service.optimal_ranges[prop]['max']
+    edges = [0, -1, min_val, max_val, 2 * max_val, 3 * max_val, min_val / 2, (min_val + max_val) / 2]
+    edges += [math.nextafter(edge, direction) for edge in (min_val, max_val, 2 * max_val) for direction in (-math.inf, math.inf)]
+    rnd = random.Random(prop)
+    for value in edges + [rnd.uniform(-max_val, 3 * max_val) for _ in range(2000)]:
+        assert _score_kernel(value, min_val, max_val) == piecewise_score(value, min_val, max_val), value
+
+
+def test_score_kernel_scores_nan_as_zero():
+    assert _score_kernel(math.nan, 6.0, 7.2) == piecewise_score(math.nan, 6.0, 7.2) == 0
+
+
+def test_repeated_calls_return_independent_results():
+    case = next(case for case in CASES if case['recommendations'] and 'raises' not in case['recommendations'])
+    first = run(recommendation_service.generate_recommendations, case)
+    first[0]['title'] = 'changed'
+    score = run(recommendation_service.get_soil_health_score, case)
+    score['property_scores'].clear()
+    assert run(recommendation_service.generate_recommendations, case) == case['recommendations']
+    assert run(recommendation_service.get_soil_health_score, case) == case['health_score']
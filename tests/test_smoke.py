@@ -0,0 +1,68 @@
+"""End-to-end walk through the API, checking that list endpoints agree with the detail endpoints"""
+from conftest import register
+
+
+def test_farm_lists_match_farm_details(client, headers, farm_id):
+    client.post('/api/farms', json={'name': 'South Field', 'latitude': '-1.3', 'longitude': 36.8}, headers=headers)
+
+    listed = client.get('/api/farms', headers=headers).get_json()
+    assert listed['total'] == 2
+    for farm in listed['farms']:
+        detail = client.get(f"/api/farms/{farm['id']}", headers=headers).get_json()
+        assert farm == detail['farm']
+
+    search = client.get('/api/search?q=north', headers=headers).get_json()
+    assert search['farms'] == [farm for farm in listed['farms'] if farm['id'] == farm_id]
+
+
+def test_analysis_lists_match_analysis_details(client, headers, farm_id, isda):
+    created = client.post(f'/api/farms/{farm_id}/soil-analysis', json={}, headers=headers)
+    assert created.status_code == 201
+    created = created.get_json()
+    assert created['recommendations'] and created['health_score']['analysis_depth'] == '0-20'
+
+    detail = client.get(f"/api/soil-analyses/{created['analysis_id']}", headers=headers).get_json()
+    assert detail['analysis'] == created['analysis']
+    assert detail['health_score'] == created['health_score']
+    assert [rec['title'] for rec in detail['recommendations']] == [rec['title'] for rec in created['recommendations']]
+
+    listed = client.get('/api/soil-analyses', headers=headers).get_json()['analyses']
+    assert listed == [dict(detail['analysis'], health_score=detail['health_score'])]
+
+    page = client.get(f'/api/farms/{farm_id}/soil-analyses', headers=headers).get_json()
+    assert page['analyses'] == [detail['analysis']] and page['total'] == 1
+
+    recommendations = client.get(f"/api/soil-analyses/{created['analysis_id']}/recommendations", headers=headers).get_json()
+    assert recommendations['total'] == len(created['recommendations'])
+    priorities = [rec['priority'] for rec in recommendations['recommendations']]
+    assert priorities == sorted(priorities)
+
+    summary = client.get(f'/api/farms/{farm_id}/soil-health-summary', headers=headers).get_json()
+    assert summary['health_score'] == created['health_score'] and summary['total_analyses'] == 1
+    assert summary['high_priority_recommendations'] == sum(1 for priority in priorities if priority <= 2)
+
+
+def test_user_overviews(client, headers, farm_id, isda):
+    client.post(f'/api/farms/{farm_id}/soil-analysis', json={}, headers=headers)
+
+    dashboard = client.get('/api/dashboard', headers=headers).get_json()
+    assert dashboard['stats']['farms_count'] == 1 and dashboard['stats']['total_analyses'] == 1
+    assert dashboard['recent_analyses'][0]['farm_name'] == 'North Field'
+
+    profile = client.get('/api/profile', headers=headers).get_json()['profile']
+    assert profile['username'] == 'farmer'
+    assert profile['stats']['farms_count'] == 1 and profile['stats']['analyses_count'] == 1
+
+    statistics = client.get('/api/statistics', headers=headers).get_json()['statistics']
+    assert statistics['farms']['total'] == 1 and statistics['analyses'] == {'total': 1, 'recent': 1}
+
+
+def test_other_users_data_is_hidden(client, headers, farm_id, isda):
+    analysis_id = client.post(f'/api/farms/{farm_id}/soil-analysis', json={}, headers=headers).get_json()['analysis_id']
+    intruder = register(client, 'intruder')
+
+    for url in (f'/api/farms/{farm_id}', f'/api/farms/{farm_id}/soil-analyses', f'/api/soil-analyses/{analysis_id}',
+                f'/api/soil-analyses/{analysis_id}/recommendations', f'/api/farms/{farm_id}/soil-health-summary'):
+        assert client.get(url, headers=intruder).status_code == 404, url
+    assert client.get('/api/soil-analyses', headers=intruder).get_json() == {'analyses': []}
+    assert client.get('/api/farms', headers=intruder).get_json()['total'] == 0
@@ -0,0 +1,88 @@
+from unittest import mock
+
+from sqlalchemy import event, update
+
+from conftest import soil_properties
+from src.models.user import db
+from src.models.soil_analysis import SoilAnalysis
+from src.services.isda_service import isda_service
+from src.services.recommendation_service import recommendation_service
+
+
+def analyze(client, headers, farm_id, **body):
+    resp = client.post(f'/api/farms/{farm_id}/soil-analysis', json=body, headers=headers)
+    assert resp.status_code == 201, resp.get_data(as_text=True)
+    return resp.get_json()
+
+
+def test_farm_analyses_page_carries_the_total(client, headers, farm_id, isda):
+    ids = [analyze(client, headers, farm_id)['analysis_id'] for _ in range(3)]
+    url = f'/api/farms/{farm_id}/soil-analyses'
+
+    page = client.get(f'{url}?limit=2', headers=headers).get_json()
+    assert page['total'] == 3 and [a['id'] for a in page['analyses']] == ids[:0:-1]
+
+    page = client.get(f'{url}?limit=2&offset=2', headers=headers).get_json()
+    assert page['total'] == 3 and [a['id'] for a in page['analyses']] == ids[:1]
+
+    # A page past the end has no rows to carry the window count
+    page = client.get(f'{url}?limit=2&offset=5', headers=headers).get_json()
+    assert page == {'analyses': [], 'total': 3, 'limit': 2, 'offset': 5}
+
+
+def test_farm_analyses_page_of_an_empty_farm(client, headers, farm_id):
+    page = client.get(f'/api/farms/{farm_id}/soil-analyses', headers=headers).get_json()
+    assert page == {'analyses': [], 'total': 0, 'limit': 10, 'offset': 0}
+
+
+def test_health_score_is_stored_at_the_analysis_depth(client, headers, farm_id, isda):
+    isda.properties = soil_properties(depth='20-50')
+    created = analyze(client, headers, farm_id, depth='20-50')
+    expected = recommendation_service.get_soil_health_score(soil_properties(depth='20-50'), depth='20-50')
+    assert expected['overall_score'] > 0 and created['health_score'] == expected
+
+    detail = client.get(f"/api/soil-analyses/{created['analysis_id']}", headers=headers).get_json()
+    listed = client.get('/api/soil-analyses', headers=headers).get_json()['analyses']
+    summary = client.get(f'/api/farms/{farm_id}/soil-health-summary', headers=headers).get_json()
+    assert detail['health_score'] == listed[0]['health_score'] == summary['health_score'] == expected
+
+
+def test_isda_layers_are_cached(client, headers):
+    with mock.patch.object(isda_service, 'get_available_layers', return_value={'layers': ['ph']}) as fetch, \
+         mock.patch('src.routes.soil_analysis._authenticate_isda', return_value=True):
+        for _ in range(3):
+            assert client.get('/api/isda/layers', headers=headers).get_json() == {'layers': ['ph']}
+    assert fetch.call_count == 1
+
+
+def test_isda_layer_failures_are_not_cached(client, headers):
+    with mock.patch.object(isda_service, 'get_available_layers', side_effect=[None, {'layers': ['ph']}]), \
+         mock.patch('src.routes.soil_analysis._authenticate_isda', return_value=True):
+        assert client.get('/api/isda/layers', headers=headers).status_code == 503
+        assert client.get('/api/isda/layers', headers=headers).get_json() == {'layers': ['ph']}
+
+
+def test_list_backfills_scores_of_older_analyses(app, client, headers, farm_id, isda):
+    created = [analyze(client, headers, farm_id), analyze(client, headers, farm_id, depth='20-50')]
+    with app.app_context():
+        db.session.execute(update(SoilAnalysis).values(health_score=None))
+        db.session.commit()
+
+    statements = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement.split()[0], executemany))
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        listed = client.get('/api/soil-analyses', headers=headers).get_json()['analyses']
+    finally:
+        with app.app_context():
+            event.remove(db.engine, 'before_cursor_execute', record)
+    assert {a['id']: a['health_score'] for a in listed} == {c['analysis_id']: c['health_score'] for c in created}
+    # Both rows are written back by a single executemany UPDATE
+    assert [s for s in statements if s[0] == 'UPDATE'] == [('UPDATE', True)]
+
+    # The scores were written back, so the next read finds them stored
+    with app.app_context():
+        stored = {a.id: a.health_score for a in SoilAnalysis.query.all()}
+    assert stored == {c['analysis_id']: c['health_score'] for c in created}
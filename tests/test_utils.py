@@ -0,0 +1,96 @@
+import json
+
+from sqlalchemy import update
+
+from conftest import register
+from src.main import _create_tables
+from src.models.user import db
+from src.models.soil_analysis import SoilAnalysis
+from src.extensions import cache
+
+
+def dashboard(client, headers):
+    resp = client.get('/api/dashboard', headers=headers)
+    assert resp.status_code == 200, resp.get_data(as_text=True)
+    return resp.get_json()
+
+
+def test_cached_dashboard_follows_writes(client, headers, farm_id, isda):
+    assert dashboard(client, headers)['stats']['farms_count'] == 1
+
+    south = client.post('/api/farms', json={'name': 'South Field', 'latitude': 1.0, 'longitude': 36.0}, headers=headers)
+    assert dashboard(client, headers)['stats']['farms_count'] == 2
+
+    client.post(f'/api/farms/{farm_id}/soil-analysis', json={}, headers=headers)
+    assert dashboard(client, headers)['stats']['total_analyses'] == 1
+
+    client.put(f'/api/farms/{farm_id}', json={'name': 'East Field'}, headers=headers)
+    assert dashboard(client, headers)['recent_analyses'][0]['farm_name'] == 'East Field'
+
+    client.put('/api/profile', json={'full_name': 'New Name'}, headers=headers)
+    assert dashboard(client, headers)['user']['full_name'] == 'New Name'
+
+    client.delete(f"/api/farms/{south.get_json()['farm']['id']}", headers=headers)
+    assert dashboard(client, headers)['stats']['farms_count'] == 1
+
+
+def test_dashboard_of_a_deleted_user(client, headers):
+    user_id = dashboard(client, headers)['user']['id']
+    assert client.delete(f'/api/users/{user_id}').status_code == 204
+    assert client.get('/api/dashboard', headers=headers).status_code == 404
+
+
+def test_dashboard_averages_the_latest_five_scores(app, client, headers, farm_id, isda):
+    ids = [client.post(f'/api/farms/{farm_id}/soil-analysis', json={}, headers=headers).get_json()['analysis_id']
+           for _ in range(6)]
+    with app.app_context():
+        for analysis_id, score in zip(ids, (10, 20, 0, 40, 50, 60)):
+            db.session.execute(update(SoilAnalysis).where(SoilAnalysis.id == analysis_id).values(overall_score=score))
+        db.session.commit()
+
+    # The oldest score falls outside the latest five and the zero score is left out
+    assert dashboard(client, headers)['stats']['average_soil_health'] == 42.5
+
+
+def test_init_db_backfills_unscored_analyses(app, client, headers, farm_id, isda):
+    created = client.post(f'/api/farms/{farm_id}/soil-analysis', json={}, headers=headers).get_json()
+    with app.app_context():
+        db.session.execute(update(SoilAnalysis).values(health_score=None, overall_score=None))
+        db.session.commit()
+
+    # Reading the dashboard doesn't write; unscored rows just drop out of the average
+    assert dashboard(client, headers)['stats']['average_soil_health'] is None
+    with app.app_context():
+        assert db.session.get(SoilAnalysis, created['analysis_id']).overall_score is None
+        _create_tables()
+        analysis = db.session.get(SoilAnalysis, created['analysis_id'])
+        assert analysis.health_score == created['health_score']
+        assert analysis.overall_score == created['health_score']['overall_score']
+
+    cache.clear()
+    assert dashboard(client, headers)['stats']['average_soil_health'] == created['health_score']['overall_score']
+
+
+def test_app_info_is_public(client):
+    first = client.get('/api/app-info')
+    assert first.status_code == 200 and first.get_json()['app_name'] == 'AgriSense API'
+    assert client.get('/api/app-info').get_json() == first.get_json()
+
+
+def test_statistics_stream_is_valid_json(client, headers):
+    for name, crop in (('A', 'maize'), ('B', 'maize'), ('C', 'beans'), ('D', '')):
+        client.post('/api/farms', json={'name': name, 'latitude': 1.0, 'longitude': 36.0, 'crop_type': crop}, headers=headers)
+
+    resp = client.get('/api/statistics?days=7', headers=headers)
+    assert resp.status_code == 200 and resp.mimetype == 'application/json'
+    statistics = json.loads(resp.get_data())['statistics']
+    assert statistics['period_days'] == 7
+    assert statistics['farms']['total'] == 4
+    assert sorted((c['crop_type'], c['count']) for c in statistics['farms']['crop_distribution']) == [('beans', 1), ('maize', 2)]
+    assert statistics['analyses'] == {'total': 0, 'recent': 0}
+    assert statistics['recommendations'] == {'total': 0, 'high_priority': 0}
+
+
+def test_statistics_without_farms(client):
+    statistics = json.loads(client.get('/api/statistics', headers=register(client, 'newcomer')).get_data())['statistics']
+    assert statistics['farms'] == {'total': 0, 'crop_distribution': []}